@@ -0,0 +1,55 @@
+# Compare the push/pop checker with the incremental one:
+# the first N candidates of the BFS order of each benchmark are checked by both,
+# and the number of solver checks and solver time of each mode are reported
+# (candidates the ground examples reject never reach the solver).
+#
+#   python bench_checker.py [-n N] [benchmark.sl ...]   (default: everything in open_tests)
+import sys
+import glob
+import argparse
+import collections
+import translator
+import grammar
+import terms
+from main import ReadBenchmark
+
+
+def Candidates(Grammar,N):
+    Rules = terms.CompileRules(Grammar)
+    BfsQueue = collections.deque([terms.StartPartial(Grammar)])
+    ret = []
+    while len(BfsQueue)!=0 and len(ret)<N:
+        Curr = BfsQueue.popleft()
+        if Curr.holes==0:
+            ret.append(terms.ToList(Curr.term(Grammar)))
+        BfsQueue += [child for rule, child in Curr.expand(Rules)]
+    return ret
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('benchmarks', nargs='*')
+    argParser.add_argument('-n', type=int, default=200, help='candidates per benchmark')
+    args = argParser.parse_args()
+    files = args.benchmarks or sorted(glob.glob('open_tests/*.sl'))
+
+    Total = {False:0.0, True:0.0}
+    Checks = {False:0, True:0}
+    print('%-24s %10s %22s %22s' % ('benchmark', 'candidates', 'push/pop', 'incremental'))
+    for path in files:
+        bmExpr, SynFunExpr = ReadBenchmark(path)
+        Programs = Candidates(grammar.Grammar(SynFunExpr),args.n)
+        checkers = {}
+        Accepted = {}
+        for mode in (False,True): # one mode after the other, the two solvers share Z3's context
+            checkers[mode] = translator.ReadQuery(bmExpr,incremental=mode)
+            Accepted[mode] = [checkers[mode].checkProgram(Program) is None for Program in Programs]
+        for i in range(len(Programs)):
+            if Accepted[False][i] != Accepted[True][i]:
+                print('modes disagree on %s: %s' % (path, translator.toString(Programs[i])), file=sys.stderr)
+        for mode in (False,True):
+            Total[mode] += checkers[mode].solverTime
+            Checks[mode] += checkers[mode].checkCount
+        print('%-24s %10d %6d checks %7.3fs %6d checks %7.3fs' % (path.split('/')[-1], len(Programs),
+              checkers[False].checkCount, checkers[False].solverTime, checkers[True].checkCount, checkers[True].solverTime))
+    print('%-24s %10s %6d checks %7.3fs %6d checks %7.3fs' % ('total', '', Checks[False], Total[False], Checks[True], Total[True]))
@@ -0,0 +1,61 @@
+# Speedup curve of the sharded top-down search: every benchmark is solved with
+# 1, 2, 4, ... workers (main.py --cegis --workers N, each run a fresh process)
+# and the wall time of each run is printed, with the speedup over one worker.
+#
+#   python bench_parallel.py [-w 1,2,4] [--timeout S] [--options=OPTIONS] [benchmark.sl ...]
+#   (default: everything in open_tests)
+import os
+import sys
+import glob
+import time
+import argparse
+import shlex
+import subprocess
+
+
+def Run(path, workers, options, timeout):
+    # -> seconds, or None if the run timed out or gave no answer
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'),
+               '--cegis', '--workers', str(workers)] + shlex.split(options) + [path]
+    timeStart = time.time()
+    try:
+        out = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout, text=True).stdout
+    except subprocess.TimeoutExpired:
+        return None
+    if not out.startswith('(define-fun'):
+        return None
+    return time.time() - timeStart
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('benchmarks', nargs='*')
+    argParser.add_argument('-w', '--workers', default='1,2,4', help='comma-separated worker counts')
+    argParser.add_argument('--timeout', type=float, default=300, help='seconds per run')
+    argParser.add_argument('--options', default='', help='further main.py options for every run, given as --options="..."')
+    args = argParser.parse_args()
+    files = args.benchmarks or sorted(glob.glob('open_tests/*.sl'))
+    Workers = [int(w) for w in args.workers.split(',')]
+
+    print('%d cpus' % os.cpu_count())
+    print('%-24s' % 'benchmark' + ''.join('%14s' % ('%d workers' % w) for w in Workers))
+    Total = {w: 0.0 for w in Workers}
+    Solved = [] # benchmarks every worker count solved, for the total
+    for path in files:
+        Times = {w: Run(path, w, args.options, args.timeout) for w in Workers}
+        cells = []
+        for w in Workers:
+            if Times[w] is None:
+                cells.append('%14s' % '-')
+            elif Times[Workers[0]] is None or w == Workers[0]:
+                cells.append('%13.2fs' % Times[w])
+            else:
+                cells.append('%7.2fs %4.1fx' % (Times[w], Times[Workers[0]] / Times[w]))
+        print('%-24s' % path.split('/')[-1] + ''.join(cells))
+        if all(t is not None for t in Times.values()):
+            Solved.append(path)
+            for w in Workers:
+                Total[w] += Times[w]
+    if len(Solved) > 0:
+        print('%-24s' % ('total (%d solved)' % len(Solved)) +
+              ''.join('%7.2fs %4.1fx' % (Total[w], Total[Workers[0]] / Total[w]) for w in Workers))
@@ -0,0 +1,218 @@
+# Bottom-up enumeration with observational equivalence: terms are built per
+# nonterminal and per size from the compiled grammar, and a term is only kept
+# if no smaller term of the same nonterminal has the same outputs on the inputs
+# collected from the current counter-examples.
+import itertools
+import translator
+import vectorized
+from evaluator import Evaluate, Undecided
+from cegis import Undef
+from grammar import Fill
+
+CHUNK = 4096 # rows per batch in vectorized mode
+
+
+def Compositions(total, parts):
+    # every tuple of `parts` positive sizes adding up to `total`
+    if parts == 1:
+        if total >= 1:
+            yield (total,)
+        return
+    for first in range(1, total - parts + 2):
+        for rest in Compositions(total - first, parts - 1):
+            yield (first,) + rest
+
+
+class Level:
+    # the terms of one nonterminal and size; in vectorized mode their signatures
+    # are also stacked into a (terms x inputs) matrix once the level is complete
+    def __init__(self):
+        self.Programs = []
+        self.Sigs = []
+        self.Rows = []
+        self.MaskRows = []
+
+    def freeze(self):
+        if len(self.Rows) == 0:
+            return
+        self.Values = vectorized.numpy.stack(self.Rows)
+        if all(m is None for m in self.MaskRows):
+            self.Masks = None
+        else:
+            n = self.Values.shape[1]
+            self.Masks = vectorized.numpy.stack([m if m is not None else vectorized.numpy.ones(n, dtype=bool) for m in self.MaskRows])
+        self.Rows = self.MaskRows = None
+
+
+def RowKey(row, mask):
+    if mask is not None:
+        row = vectorized.numpy.where(mask, row, False if row.dtype == bool else 0)
+        maskKey = mask.tobytes()
+    else:
+        maskKey = None
+    if row.dtype == object:
+        return ('o', tuple(row.tolist()), maskKey)
+    return (row.dtype.char, row.tobytes(), maskKey)
+
+
+class BottomUp:
+    def __init__(self, grammar, FuncDefine, cegisChecker):
+        self.FuncDefine = FuncDefine
+        self.cegisChecker = cegisChecker
+        self.argNames = [arg[0] for arg in FuncDefine[2]]
+        self.NonTerms = [NT for NT in range(len(grammar.NTNames)) if grammar.Productive[NT] and grammar.Reachable[NT]]
+        self.StartNTs = set([grammar.Start])
+        self.Rules = {} # NT -> [(template, hole nonterminals)]
+        for NT in self.NonTerms:
+            self.Rules[NT] = [(grammar.Templates[p], list(grammar.children(p))) for p in grammar.productions(NT) if grammar.useful(p)]
+        self.Bools = set(NT for NT in self.NonTerms if grammar.NTSorts[NT] == 'Bool')
+        self.vectorized = vectorized.numpy is not None
+        self.Count = 0
+        self.Refuted = set() # candidates Z3 rejected although no stored point could (undefined outputs)
+
+    def signature(self, Tmpl, ChildSigs, Inputs):
+        ret = []
+        for i in range(len(Inputs)):
+            Env = dict(zip(self.argNames, Inputs[i]))
+            undefined = False
+            for j in range(len(ChildSigs)):
+                if ChildSigs[j][i] is Undef:
+                    undefined = True
+                    break
+                Env['$%d' % j] = ChildSigs[j][i]
+            if undefined:
+                ret.append(Undef)
+                continue
+            try:
+                ret.append(Evaluate(Tmpl, Env, self.cegisChecker.Funcs))
+            except Undecided:
+                ret.append(Undef)
+        return tuple(ret)
+
+    def expand(self, Tmpl, Levels, Inputs, Seen):
+        # new (program, signature, row, mask) for Tmpl applied to every combination of Levels, one at a time
+        for Children in itertools.product(*[range(len(L.Programs)) for L in Levels]):
+            Sig = self.signature(Tmpl, [Levels[j].Sigs[Children[j]] for j in range(len(Levels))], Inputs)
+            if Sig in Seen:
+                continue
+            Seen.add(Sig)
+            yield Fill(Tmpl, [Levels[j].Programs[Children[j]] for j in range(len(Levels))]), Sig, None, None
+
+    def row(self, Sig, NT):
+        # signature -> (row, mask) as expandBatch makes them
+        numpy = vectorized.numpy
+        if NT in self.Bools:
+            row = numpy.array([v is not Undef and bool(v) for v in Sig], dtype=bool)
+        else:
+            row = vectorized.Column([0 if v is Undef else v for v in Sig])
+        mask = numpy.array([v is not Undef for v in Sig], dtype=bool)
+        return row, None if mask.all() else mask
+
+    def expandRows(self, Tmpl, Levels, Inputs, Seen, NT):
+        # expand for templates EvaluateBatch has no version of, with rows for the vectorized levels
+        for Children in itertools.product(*[range(len(L.Programs)) for L in Levels]):
+            Sig = self.signature(Tmpl, [Levels[j].Sigs[Children[j]] for j in range(len(Levels))], Inputs)
+            row, mask = self.row(Sig, NT)
+            key = RowKey(row, mask)
+            if key in Seen:
+                continue
+            Seen.add(key)
+            yield Fill(Tmpl, [Levels[j].Programs[Children[j]] for j in range(len(Levels))]), Sig, row, mask
+
+    def expandBatch(self, Tmpl, Levels, Inputs, Seen):
+        # same as expand, but evaluates CHUNK combinations per array operation
+        numpy = vectorized.numpy
+        Shape = [len(L.Programs) for L in Levels]
+        Total = 1
+        for k in Shape:
+            Total *= k
+        for start in range(0, Total, CHUNK):
+            Index = numpy.unravel_index(numpy.arange(start, min(Total, start + CHUNK)), Shape) if len(Shape) > 0 else ()
+            Env = dict(self.Columns)
+            for j in range(len(Levels)):
+                Env['$%d' % j] = (Levels[j].Values[Index[j]], None if Levels[j].Masks is None else Levels[j].Masks[Index[j]])
+            Values, Masks = vectorized.EvaluateBatch(Tmpl, Env)
+            rows = len(Index[0]) if len(Levels) > 0 else 1
+            Values = numpy.broadcast_to(Values, (rows, len(Inputs)))
+            if Masks is not None:
+                Masks = numpy.broadcast_to(Masks, (rows, len(Inputs)))
+            for r in range(rows):
+                mask = None if Masks is None or Masks[r].all() else Masks[r]
+                key = RowKey(Values[r], mask)
+                if key in Seen:
+                    continue
+                Seen.add(key)
+                Sig = tuple(Values[r].tolist())
+                if mask is not None:
+                    Sig = tuple(Sig[i] if mask[i] else Undef for i in range(len(Sig)))
+                yield Fill(Tmpl, [Levels[j].Programs[Index[j][r]] for j in range(len(Levels))]), Sig, Values[r], mask
+
+    def generate(self, Inputs):
+        # every term observational equivalence keeps, as (NT, size, program, signature), smallest first
+        if self.vectorized:
+            self.Columns = {}
+            for i in range(len(self.argNames)):
+                self.Columns[self.argNames[i]] = (vectorized.Column([inp[i] for inp in Inputs]), None)
+        Bank = {NT: {} for NT in self.NonTerms} # NT -> size -> Level
+        Seen = {NT: set() for NT in self.NonTerms}
+        size = 0
+        while True:
+            size += 1
+            for NT in self.NonTerms:
+                Bank[NT][size] = Level()
+            for NT in self.NonTerms:
+                Current = Bank[NT][size]
+                for Tmpl, Holes in self.Rules[NT]:
+                    if len(Holes) == 0:
+                        Choices = [[]] if size == 1 else []
+                    else:
+                        Choices = []
+                        for Sizes in Compositions(size - 1, len(Holes)):
+                            Levels = [Bank[Holes[j]][Sizes[j]] for j in range(len(Holes))]
+                            if all(len(L.Programs) > 0 for L in Levels):
+                                Choices.append(Levels)
+                    for Levels in Choices:
+                        if self.vectorized and vectorized.Batchable(Tmpl):
+                            Terms = self.expandBatch(Tmpl, Levels, Inputs, Seen[NT])
+                        elif self.vectorized:
+                            Terms = self.expandRows(Tmpl, Levels, Inputs, Seen[NT], NT)
+                        else:
+                            Terms = self.expand(Tmpl, Levels, Inputs, Seen[NT])
+                        for Program, Sig, row, mask in Terms:
+                            Current.Programs.append(Program)
+                            Current.Sigs.append(Sig)
+                            if self.vectorized:
+                                Current.Rows.append(row)
+                                Current.MaskRows.append(mask)
+                            self.Count += 1
+                            yield NT, size, Program, Sig
+            if self.vectorized:
+                for NT in self.NonTerms:
+                    Bank[NT][size].freeze()
+
+    def enumerate(self):
+        # one round over the current counter-examples; returns the answer, or None when a new counter-example arrived
+        Inputs = self.cegisChecker.Inputs()
+        for NT, size, Program, Sig in self.generate(Inputs):
+            if NT in self.StartNTs:
+                Ans = self.consider(Program, Sig, Inputs)
+                if Ans is not False:
+                    return Ans
+
+    def consider(self, Program, Sig, Inputs):
+        # False: rejected on the stored points; None: new counter-example; otherwise the answer
+        if self.cegisChecker.failingPointOutputs(dict(zip(Inputs, Sig))) is not None:
+            return False
+        if Undef in Sig and str(Program) in self.Refuted:
+            return False
+        if self.cegisChecker.verify(Program) is None:
+            return translator.DefineFunString(self.FuncDefine, Program)
+        if Undef in Sig:
+            self.Refuted.add(str(Program))
+        return None
+
+    def search(self):
+        while True:
+            Ans = self.enumerate()
+            if Ans is not None:
+                return Ans
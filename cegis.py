@@ -0,0 +1,157 @@
+# Counter-example guided checking: every model Z3 returns is kept as a concrete
+# input point, and new candidates are run on those points in Python first.
+# Only candidates that survive every stored point are sent to the solver.
+import translator
+from evaluator import Evaluate, Undecided
+
+
+Undef=object() # output of a candidate on an input where SMT-LIB leaves it unspecified
+
+
+class CegisChecker:
+    def __init__(self, checker):
+        self.checker=checker
+        SynFunExpr=checker.SynFunExpr
+        self.synFunName=SynFunExpr[1]
+        self.argNames=[arg[0] for arg in SynFunExpr[2]]
+        self.Funcs={}
+        for name in checker.FunDefMap:
+            FunDef=checker.FunDefMap[name]
+            self.Funcs[name]=([arg[0] for arg in FunDef[2]],FunDef[4])
+        self.Specs=[translator.ConstraintBody(constraint) for constraint in checker.Constraints]
+        self.callSites=[]
+        for spec in self.Specs:
+            self.findCallSites(spec)
+        self.points=[]
+        self.pointKeys=set()
+        self.inputs=None
+        self.solverCalls=0
+        self.concreteRejects=0
+        self.onCounterexample=None # called with every point verify adds, e.g. to share it with other workers
+
+    def findCallSites(self,Expr):
+        if type(Expr)!=list:
+            return
+        if len(Expr)>0 and Expr[0]==self.synFunName:
+            self.callSites.append(Expr[1:])
+        for e in Expr:
+            self.findCallSites(e)
+
+    def addPoint(self,point):
+        key=tuple(sorted(point.items()))
+        if key in self.pointKeys:
+            return
+        self.pointKeys.add(key)
+        self.points.append(point)
+        self.inputs=None
+
+    def Inputs(self):
+        # distinct argument tuples the spec applies the synth-fun to, over all stored points
+        if self.inputs is None:
+            self.inputs=[]
+            seen=set()
+            for point in self.points:
+                for site in self.callSites:
+                    try:
+                        args=tuple(Evaluate(e,point,self.Funcs) for e in site)
+                    except (Undecided,ValueError): # e.g. nested calls to the synth-fun itself
+                        continue
+                    if args not in seen:
+                        seen.add(args)
+                        self.inputs.append(args)
+        return self.inputs
+
+    def failingPointOutputs(self,Outputs):
+        # like failingPoint, but the candidate is given by its value on each of Inputs()
+        def lookup(*args):
+            if args not in Outputs:
+                raise Undecided('input not tabulated')
+            value=Outputs[args]
+            if value is Undef:
+                raise Undecided('candidate undefined here')
+            return value
+        Funcs=dict(self.Funcs)
+        Funcs[self.synFunName]=lookup
+        for i in range(len(self.points)):
+            for spec in self.Specs:
+                try:
+                    if not Evaluate(spec,self.points[i],Funcs):
+                        return i
+                except Undecided:
+                    continue
+        return None
+
+    def passingPoints(self,Outputs):
+        # bitset of the stored points where the candidate given by its value on each of Inputs()
+        # satisfies every spec; a point the candidate leaves undecided does not count
+        def lookup(*args):
+            if args not in Outputs or Outputs[args] is Undef:
+                raise Undecided('candidate undefined here')
+            return Outputs[args]
+        Funcs=dict(self.Funcs)
+        Funcs[self.synFunName]=lookup
+        ret=0
+        for i in range(len(self.points)):
+            try:
+                if all(Evaluate(spec,self.points[i],Funcs) for spec in self.Specs):
+                    ret|=1<<i
+            except Undecided:
+                pass
+        return ret
+
+    def holdsAt(self,Program,i):
+        # the program satisfies every spec at stored point i (undecided counts as no)
+        Funcs=dict(self.Funcs)
+        Funcs[self.synFunName]=(self.argNames,Program)
+        try:
+            return all(Evaluate(spec,self.points[i],Funcs) for spec in self.Specs)
+        except Undecided:
+            return False
+
+    def singleInvocation(self):
+        # whether every call site applies the synth-fun to the same arguments, so that the ones of the
+        # first site (pointInputs) are the only inputs a case split has to decide
+        return all(site==self.callSites[0] for site in self.callSites)
+
+    def pointInputs(self):
+        # the arguments of the first call site at each stored point (None where they cannot be evaluated)
+        ret=[]
+        for point in self.points:
+            try:
+                ret.append(tuple(Evaluate(e,point,self.Funcs) for e in self.callSites[0]))
+            except (Undecided,ValueError,IndexError):
+                ret.append(None)
+        return ret
+
+    def failingPoint(self,Program):
+        # index of a stored point the program violates, or None if it passes all of them
+        Funcs=dict(self.Funcs)
+        Funcs[self.synFunName]=(self.argNames,Program)
+        for i in range(len(self.points)):
+            for spec in self.Specs:
+                try:
+                    if not Evaluate(spec,self.points[i],Funcs):
+                        return i
+                except Undecided:
+                    continue # let Z3 judge this constraint
+        return None
+
+    def check(self,Program):
+        i=self.failingPoint(Program)
+        if i is not None:
+            self.concreteRejects+=1
+            if i>0: # move-to-front: the point that killed this candidate will likely kill its neighbours
+                self.points.insert(0,self.points.pop(i))
+            return self.points[0]
+        return self.verify(Program)
+
+    def verify(self,Program):
+        # ask Z3 and remember the counter-example, if any
+        self.solverCalls+=1
+        model=self.checker.checkProgram(Program)
+        if model is not None:
+            point=self.checker.getPoint(model)
+            self.addPoint(point)
+            if self.onCounterexample is not None:
+                self.onCounterexample(point)
+        return model
@@ -0,0 +1,54 @@
+# Constant synthesis for grammars built with Grammar(..., constants=True): a
+# complete program that contains constant leaves (@NT) is a sketch. Its
+# constants are solved by Z3 over the stored counter-examples, restricted to
+# the literals the grammar lists, and the concrete program goes through the
+# usual check. A new counter-example rules the values out and they are solved
+# again, until the sketch is verified or no values are left.
+
+MAX_ROUNDS = 64 # per sketch, for (Constant Int) leaves whose values are not bounded
+
+
+def Fill(Expr, Values):
+    if type(Expr) == list:
+        return [Fill(e, Values) for e in Expr]
+    if Expr in Values:
+        return str(Values[Expr]) # as grammar.Literal writes it, so negative values stay one leaf
+    return Expr
+
+
+class ConstantSolver:
+    def __init__(self, grammar, cegisChecker):
+        self.grammar = grammar
+        self.cegisChecker = cegisChecker
+        self.sketches = 0
+        self.refuted = 0 # sketches without any constants that fit the stored points
+
+    def holes(self, Program, Consts):
+        # Program with every constant leaf renamed apart (@Start0, @Start1, ...); Consts gets their allowed values
+        if type(Program) == list:
+            return [self.holes(e, Consts) for e in Program]
+        if Program in self.grammar.Constants:
+            name = '%s%d' % (Program, len(Consts))
+            Consts[name] = self.grammar.Constants[Program]
+            return name
+        return Program
+
+    def complete(self, Program, check):
+        # a concrete version of Program that passes check, or None
+        Consts = {}
+        sketch = self.holes(Program, Consts)
+        if len(Consts) == 0:
+            return Program if check(Program) is None else None
+        self.sketches += 1
+        for i in range(MAX_ROUNDS):
+            points = len(self.cegisChecker.points)
+            values = self.cegisChecker.checker.solveConstants(sketch, Consts, self.cegisChecker.points)
+            if values is None:
+                self.refuted += 1
+                return None
+            concrete = Fill(sketch, values)
+            if check(concrete) is None:
+                return concrete
+            if len(self.cegisChecker.points) == points: # rejected without a new point, solving again would not help
+                return None
+        return None
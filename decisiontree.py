@@ -0,0 +1,170 @@
+# Decision trees over bitsets, for choosing the ite guards of a unified
+# program. Points are numbered 0, 1, ...; a label (a term) and a feature (a
+# predicate) are each given by the set of points where the term is right / the
+# predicate holds, as a Python int or a NumPy bool array. A new point appends
+# one bit to every set, so the tree can be learned again without evaluating
+# the old points. Splits are chosen by information gain, computed for all
+# features at once with NumPy when it is installed.
+import math
+try:
+    import numpy
+except ImportError: # plain int bitsets only
+    numpy = None
+
+
+def Bits(x):
+    return bin(x).count('1')
+
+def ToInt(bits):
+    # NumPy bool array -> int bitset, point i at bit i
+    if type(bits) == int:
+        return bits
+    packed = numpy.packbits(numpy.asarray(bits, dtype=bool), bitorder='little')
+    return int.from_bytes(packed.tobytes(), 'little')
+
+def ToArray(bits, n):
+    raw = numpy.frombuffer(bits.to_bytes((n + 7) // 8, 'little'), dtype=numpy.uint8)
+    return numpy.unpackbits(raw, bitorder='little')[:n].astype(bool)
+
+def Entropy(weights):
+    # of the distribution proportional to weights
+    total = sum(weights)
+    ret = 0.0
+    for w in weights:
+        if w > 0:
+            ret -= w / total * math.log(w / total)
+    return ret
+
+
+class Learner:
+    # trees are ('leaf', label) or ('split', [feature, ...], tree if all hold, tree otherwise)
+    def __init__(self, conjunctions=False, vectorized=None):
+        self.points = 0
+        self.Labels = [] # [label, bitset of the points it is right on]
+        self.Features = [] # [feature, bitset of the points where it holds]
+        self.conjunctions = conjunctions # also split on conjunctions of features that isolate one label
+        self.vectorized = numpy is not None if vectorized is None else vectorized
+        self.matrices = None
+
+    def all(self):
+        return (1 << self.points) - 1
+
+    def addLabel(self, label, bits):
+        self.Labels.append([label, ToInt(bits)])
+        self.matrices = None
+
+    def addFeature(self, feature, bits):
+        self.Features.append([feature, ToInt(bits)])
+        self.matrices = None
+
+    def addPoint(self, right, holds):
+        # extend every set by one point; right(label) and holds(feature) say whether it is in
+        bit = 1 << self.points
+        for entry in self.Labels:
+            if right(entry[0]):
+                entry[1] |= bit
+        for entry in self.Features:
+            if holds(entry[0]):
+                entry[1] |= bit
+        self.points += 1
+        self.matrices = None
+
+    def covered(self):
+        union = 0
+        for label, bits in self.Labels:
+            union |= bits
+        return union == self.all()
+
+    def learn(self, S=None):
+        # tree that picks a right label on every point of S (all points by default), or None
+        if S is None:
+            S = self.all()
+        leaf = None
+        for label, bits in self.Labels:
+            if S & ~bits == 0 and (leaf is None or Bits(bits) > Bits(leaf[1])):
+                leaf = (label, bits) # the label right on most points generalizes best
+        if leaf is not None:
+            return ('leaf', leaf[0])
+        best = self.split(S)
+        if best is None:
+            return None
+        cond, T = best
+        yes = self.learn(T)
+        if yes is None:
+            return None
+        no = self.learn(S & ~T)
+        if no is None:
+            return None
+        return ('split', cond, yes, no)
+
+    def split(self, S):
+        # (features, points of S where they all hold) with the highest information gain
+        best = None
+        if self.vectorized and len(self.Features) > 0:
+            candidates = self.featureGains(S)
+        else:
+            candidates = [(self.gain(S, bits), [feature], S & bits) for feature, bits in self.Features]
+        if self.conjunctions:
+            for features, T in self.conjunctionSplits(S):
+                candidates.append((self.gain(S, T), features, S & T))
+        for gain, features, T in candidates:
+            if T == 0 or T == S:
+                continue
+            if best is None or gain > best[0]:
+                best = (gain, features, T)
+        if best is None:
+            return None
+        return best[1], best[2]
+
+    def gain(self, S, bits):
+        T = S & bits
+        F = S & ~bits
+        n = Bits(S)
+        H = lambda X: Entropy([Bits(X & l) for label, l in self.Labels])
+        return H(S) - (Bits(T) * H(T) + Bits(F) * H(F)) / n
+
+    def featureGains(self, S):
+        # every single-feature split at once: counts of (feature holds, label right) per pair as a matrix product
+        if self.matrices is None:
+            self.matrices = (numpy.array([ToArray(bits, self.points) for f, bits in self.Features]),
+                             numpy.array([ToArray(bits, self.points) for l, bits in self.Labels]).astype(numpy.int64))
+        F, L = self.matrices
+        s = ToArray(S, self.points)
+        Fs = F[:, s].astype(numpy.int64)
+        Ls = L[:, s]
+        def entropy(W):
+            total = W.sum(axis=1, keepdims=True)
+            P = W / numpy.maximum(total, 1)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                return -numpy.where(P > 0, P * numpy.log(P), 0.0).sum(axis=1)
+        yes = Fs @ Ls.T
+        no = (1 - Fs) @ Ls.T
+        nYes = Fs.sum(axis=1)
+        n = s.sum()
+        base = entropy(Ls.sum(axis=1)[None, :])[0]
+        gains = base - (nYes * entropy(yes) + (n - nYes) * entropy(no)) / n
+        return [(gains[i], [self.Features[i][0]], S & self.Features[i][1]) for i in range(len(self.Features))]
+
+    def conjunctionSplits(self, S):
+        # for every label, features joined greedily until they hold on none of the points of S where it is wrong
+        for label, cover in self.Labels:
+            Pos = S & cover
+            Neg = S & ~cover
+            if Pos == 0 or Neg == 0:
+                continue
+            C = S
+            chosen = []
+            while C & Neg:
+                pick = None
+                for feature, bits in self.Features:
+                    if C & Pos & bits == 0:
+                        continue
+                    key = (Bits(C & Neg & ~bits), Bits(C & Pos & bits))
+                    if key[0] > 0 and (pick is None or key > pick[0]):
+                        pick = (key, feature, bits)
+                if pick is None:
+                    break
+                chosen.append(pick[1])
+                C &= pick[2]
+            if C & Neg == 0 and len(chosen) > 1:
+                yield chosen, C
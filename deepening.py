@@ -0,0 +1,81 @@
+# Iterative deepening on program size for the top-down search. Each bound B
+# is a depth-first walk over the same zipper partial programs as the BFS that
+# only keeps the path from the start symbol to the current program (a partial
+# program and the index of its next rule per level), so memory is O(B)
+# instead of O(frontier). Bound B only checks programs of exactly B symbols:
+# smaller ones were refuted by earlier bounds. Sizes the grammar has no
+# program of are skipped without a walk, from the count table
+# (Grammar.counts), which is kept and extended as B grows; once the table
+# shows that a finite grammar has no larger programs, the search ends.
+import terms
+import translator
+
+
+class Deepening:
+    def __init__(self, grammar, FuncDefine, check, symmetry=None, constants=None, maxSize=None, pruners=()):
+        # check, symmetry, constants and pruners as for main.TopDownSearch; maxSize is the last bound tried
+        self.grammar = grammar
+        self.FuncDefine = FuncDefine
+        self.check = check
+        self.constants = constants
+        self.maxSize = maxSize
+        self.pruners = pruners
+        self.Rules = terms.CompileRules(grammar, symmetry)
+        self.Count = 0
+        self.bound = None # the bound being searched
+        self.skipped = 0 # bounds without any program
+
+    def programs(self, Starts, B):
+        # complete programs of exactly B symbols below the partial programs Starts, depth first
+        for start in Starts:
+            if start.holes == 0:
+                if start.size == B:
+                    yield start
+                continue
+            stack = [[start, 0]]
+            while len(stack) > 0:
+                top = stack[-1]
+                rules = self.Rules[top[0].nextHole()]
+                if top[1] == len(rules):
+                    stack.pop()
+                    continue
+                child = top[0].child(rules[top[1]])
+                top[1] += 1
+                if child.rejected or child.minSize > B:
+                    continue
+                if child.holes == 0:
+                    if child.size == B:
+                        yield child
+                elif len(self.pruners) == 0 or all(pruner.feasible(child.term(self.grammar)) for pruner in self.pruners):
+                    stack.append([child, 0])
+
+    def search(self, starts=None, poll=None, every=64):
+        # starts and poll as for main.TopDownSearch, poll() called every `every` candidates (main passes its POLL)
+        Starts = [terms.Derive(self.grammar, self.Rules, path) for path in (starts or [[]])]
+        B = min(start.minSize for start in Starts)
+        while self.maxSize is None or B <= self.maxSize:
+            self.bound = B
+            if self.grammar.counts(B)[self.grammar.Start][B] == 0:
+                if self.grammar.exhausted(B): # a finite grammar with every program checked
+                    break
+                self.skipped += 1
+                B += 1
+                continue
+            for partial in self.programs(Starts, B):
+                self.Count += 1
+                if self.Count % terms.RESET == 0:
+                    terms.Reset()
+                if poll is not None and self.Count % every == 0 and poll():
+                    return None
+                Program = terms.ToList(partial.term(self.grammar))
+                if self.constants is not None:
+                    Program = self.constants.complete(Program, self.check)
+                    counterexample = None if Program is not None else True
+                else:
+                    counterexample = self.check(Program)
+                if counterexample is None:
+                    terms.Reset()
+                    return translator.DefineFunString(self.FuncDefine, Program)
+            B += 1
+        terms.Reset()
+        return None
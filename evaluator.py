@@ -0,0 +1,120 @@
+# Concrete interpreter for the Int/Bool fragment of SyGuS, so candidates can be
+# tested on stored inputs in plain Python before anyone pays for a Z3 call.
+
+
+class Undecided(Exception):
+    # raised when SMT-LIB leaves the value open (e.g. division by zero), so
+    # only the solver can tell whether the candidate is right
+    pass
+
+
+def smtDiv(a, b):
+    if b == 0:
+        raise Undecided('div by zero')
+    q = a // b
+    if a - b * q < 0: # SMT-LIB keeps the remainder non-negative
+        q += 1 if b < 0 else -1
+    return q
+
+def smtMod(a, b):
+    if b == 0:
+        raise Undecided('mod by zero')
+    return a - b * smtDiv(a, b)
+
+def smtMinus(*args):
+    if len(args) == 1:
+        return -args[0]
+    ret = args[0]
+    for a in args[1:]:
+        ret -= a
+    return ret
+
+def smtMul(*args):
+    ret = 1
+    for a in args:
+        ret *= a
+    return ret
+
+def smtImplies(*args):
+    ret = args[-1]
+    for a in reversed(args[:-1]):
+        ret = (not a) or ret
+    return ret
+
+def chain(op):
+    def f(*args):
+        for i in range(len(args) - 1):
+            if not op(args[i], args[i+1]):
+                return False
+        return True
+    return f
+
+def smtDistinct(*args):
+    return len(set(args)) == len(args)
+
+Operators = {
+    '+': lambda *args: sum(args),
+    '-': smtMinus,
+    '*': smtMul,
+    'div': smtDiv,
+    'mod': smtMod,
+    'abs': abs,
+    'not': lambda a: not a,
+    '=>': smtImplies,
+    'xor': lambda a, b: a != b,
+    '=': chain(lambda a, b: a == b),
+    '<': chain(lambda a, b: a < b),
+    '<=': chain(lambda a, b: a <= b),
+    '>': chain(lambda a, b: a > b),
+    '>=': chain(lambda a, b: a >= b),
+    'distinct': smtDistinct,
+}
+
+
+def Literal(Expr):
+    # ('Int', n) / ('Bool', 0|1) tuples from the parser, or numerals that main.py already turned into strings
+    if type(Expr) == tuple:
+        return bool(Expr[1]) if Expr[0] == 'Bool' else Expr[1]
+    if Expr == 'true':
+        return True
+    if Expr == 'false':
+        return False
+    return int(Expr)
+
+
+def Evaluate(Expr, Env, Funcs):
+    # Env maps variable names to values, Funcs maps function names to (argument names, body)
+    # or to a python callable taking the evaluated arguments
+    if type(Expr) == str:
+        if Expr in Env:
+            return Env[Expr]
+        return Literal(Expr)
+    if type(Expr) == tuple:
+        return Literal(Expr)
+    if len(Expr) == 1:
+        return Evaluate(Expr[0], Env, Funcs)
+    op = Expr[0]
+    # short-circuit operators first, they must not evaluate every argument
+    if op == 'ite':
+        if Evaluate(Expr[1], Env, Funcs):
+            return Evaluate(Expr[2], Env, Funcs)
+        return Evaluate(Expr[3], Env, Funcs)
+    if op == 'and':
+        for e in Expr[1:]:
+            if not Evaluate(e, Env, Funcs):
+                return False
+        return True
+    if op == 'or':
+        for e in Expr[1:]:
+            if Evaluate(e, Env, Funcs):
+                return True
+        return False
+    args = [Evaluate(e, Env, Funcs) for e in Expr[1:]]
+    if op in Funcs:
+        if callable(Funcs[op]):
+            return Funcs[op](*args)
+        argNames, body = Funcs[op]
+        return Evaluate(body, dict(zip(argNames, args)), Funcs)
+    if op in Operators:
+        return Operators[op](*args)
+    raise ValueError('unknown operator %s' % op)
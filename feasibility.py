@@ -0,0 +1,63 @@
+# Z3 feasibility check of partial programs near the root of the top-down
+# search. Every open hole becomes a fresh uninterpreted function of the
+# synth-fun's arguments; if no such functions make the examples and the spec
+# hold at the stored counter-examples, no completion from the grammar can
+# either, and the whole subtree below the partial program is dropped. The
+# query is quantifier-free, so Z3 answers it quickly or times out (and the
+# program is kept). Checks are limited to partial programs of small depth and
+# stop once they have used up their time budget.
+import time
+import terms
+
+TIMEOUT = 200 # milliseconds per query
+
+
+class FeasibilityChecker:
+    def __init__(self, grammar, cegisChecker, maxDepth=2, budget=10.0):
+        self.grammar = grammar
+        self.cegisChecker = cegisChecker
+        self.checker = cegisChecker.checker
+        self.maxDepth = maxDepth # deepest partial program checked
+        self.budget = budget # seconds of checking in total
+        self.spent = 0.0
+        self.checked = 0
+        self.eliminated = 0 # subtrees cut off
+        self.unknown = 0 # queries Z3 gave up on
+
+    def holes(self, Expr, Holes, Consts):
+        # Expr with its nonterminal leaves and its constant leaves (--constants) renamed apart;
+        # Holes gets name -> sort, Consts name -> allowed values (None for any integer)
+        if type(Expr) == list:
+            return [self.holes(e, Holes, Consts) for e in Expr]
+        if Expr in self.grammar.NTIndex:
+            name = '__HOLE_%d__' % len(Holes)
+            Holes[name] = self.grammar.NTSorts[self.grammar.NTIndex[Expr]]
+            return name
+        if Expr in self.grammar.Constants:
+            name = '__CONST_%d__' % len(Consts)
+            Consts[name] = self.grammar.Constants[Expr]
+            return name
+        return Expr
+
+    def feasible(self, term):
+        # False if the partial program (a terms.Term) provably has no completion
+        if term.holes == 0 or term.depth > self.maxDepth or self.spent >= self.budget:
+            return True
+        if len(self.cegisChecker.points) == 0 and len(self.checker.Examples) == 0:
+            return True
+        Holes = {}
+        Consts = {}
+        Program = self.holes(terms.ToList(term), Holes, Consts)
+        self.checked += 1
+        timeStart = time.time()
+        ret = self.checker.completable(Program, Holes, self.cegisChecker.points, TIMEOUT, Consts)
+        self.spent += time.time() - timeStart
+        if ret is None:
+            self.unknown += 1
+            return True
+        if not ret:
+            self.eliminated += 1
+        return ret
+
+    def report(self):
+        return f'{self.checked} partial programs checked in {self.spent:.3f}s, {self.eliminated} subtrees eliminated, {self.unknown} unknown'
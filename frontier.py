@@ -0,0 +1,365 @@
+# Frontiers for the top-down search. A frontier holds (program, cost) pairs;
+# FifoFrontier is plain BFS on a deque, PriorityFrontier pops the lowest cost
+# first from a heap (FIFO among equal costs), LazyFrontier keeps one cursor per
+# expanded parent instead of all of its children. The cost of a child is
+# computed by an Ordering from its parent's cost and the production applied.
+# Children that cannot be completed within the Ordering's size or depth bound
+# (judged from the grammar's minimum-size/depth tables), that break a
+# symmetry check or, with a normalizer, whose normal form was already queued
+# are never pushed. The pcfg order is A*: the cost of a program is its
+# negative log-likelihood plus, per open hole, the cost of the likeliest
+# completion of its nonterminal, so a rule changes the cost by the same amount
+# wherever it is applied and complete programs come out most likely first.
+# A SpillingFrontier keeps at most a fixed number of programs in memory and
+# writes the rest to disk as sorted runs of production-id sequences; popping
+# merges the in-memory heap with the heads of the runs, so the order is the
+# same as that of the frontier it replaces. Runs are merged with each other
+# past a fixed number, since each keeps a file descriptor open.
+import os
+import mmap
+import array
+import struct
+import heapq
+import json
+import tempfile
+import collections
+import pcfg
+import terms
+
+
+class Frontier:
+    # eager frontiers: expanding a program pushes all of its children at once
+    def __init__(self, order, Rules, seen, normalizer=None):
+        self.order = order
+        self.Rules = Rules
+        self.seen = seen
+        self.normalizer = normalizer # drops children whose normal form was queued before
+
+    def fits(self, child):
+        if child.rejected:
+            return False
+        if (self.order.maxSize is not None and child.minSize > self.order.maxSize) or \
+           (self.order.maxDepth is not None and child.minDepth > self.order.maxDepth):
+            self.order.pruned += 1
+            return False
+        return self.normalizer is None or self.normalizer.fresh(child)
+
+    def expand(self, parent, parentCost):
+        for rule, child in parent.expand(self.Rules):
+            if self.fits(child) and self.seen.add(child.fp):
+                self.push(child, self.order.child(parentCost, rule, child))
+
+
+class FifoFrontier(Frontier):
+    def __init__(self, order, Rules, seen, normalizer=None):
+        Frontier.__init__(self, order, Rules, seen, normalizer)
+        self.queue = collections.deque()
+
+    def push(self, program, cost):
+        self.queue.append((program, cost))
+
+    def pop(self):
+        return self.queue.popleft()
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class PriorityFrontier(Frontier):
+    def __init__(self, order, Rules, seen, normalizer=None):
+        Frontier.__init__(self, order, Rules, seen, normalizer)
+        self.heap = []
+        self.seq = 0 # tie-breaker: keeps insertion order among equal costs and never compares programs
+
+    def push(self, program, cost):
+        heapq.heappush(self.heap, (cost, self.seq, program))
+        self.seq += 1
+
+    def pop(self):
+        cost, seq, program = heapq.heappop(self.heap)
+        return program, cost
+
+    def __len__(self):
+        return len(self.heap)
+
+
+RECORD = struct.Struct('dqqq') # per program of a run: cost, seq, first production id, number of ids
+HEADER = struct.Struct('q') # programs in the run
+MAX_RUNS = 16 # live runs (each an open mapping, hence a file descriptor) before the smallest are merged
+FANIN = 8 # runs merged at once
+CHUNK = 1 << 20 # bytes of production ids buffered while a run is written
+
+
+class Run:
+    # one spilled segment, sorted by (cost, seq): a file of its length, one record per
+    # program and the production ids of all of them, mapped back into memory and read front to back
+    def __init__(self, fd):
+        self.map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        self.n, = HEADER.unpack_from(self.map, 0)
+        self.ids = memoryview(self.map)[HEADER.size + RECORD.size * self.n:].cast('i')
+        self.index = 0
+
+    def record(self, i):
+        return RECORD.unpack_from(self.map, HEADER.size + RECORD.size * i)
+
+    def path(self, i):
+        cost, seq, first, count = self.record(i)
+        return self.ids[first:first + count]
+
+    def entries(self):
+        # (cost, seq, production ids) of the programs not popped yet
+        for i in range(self.index, self.n):
+            cost, seq, first, count = self.record(i)
+            yield cost, seq, self.ids[first:first + count]
+
+    def close(self):
+        self.ids.release()
+        self.map.close()
+
+def WriteAt(fd, data, at):
+    # all of data at offset at of fd, which is not moved; returns the offset after it
+    view = memoryview(data)
+    while len(view) > 0:
+        k = os.pwrite(fd, view, at)
+        view = view[k:]
+        at += k
+    return at
+
+def WriteRun(fd, n, Entries):
+    # Entries: n (cost, seq, production ids) sorted by (cost, seq); returns the bytes written.
+    # The records are written in order and the ids at their own offset, a chunk at a time,
+    # so neither has to be held in memory
+    at = HEADER.size + RECORD.size * n
+    chunk = bytearray()
+    first = 0
+    with os.fdopen(os.dup(fd), 'wb') as f:
+        f.write(HEADER.pack(n))
+        for cost, seq, ids in Entries:
+            f.write(RECORD.pack(cost, seq, first, len(ids)))
+            chunk += ids
+            first += len(ids)
+            if len(chunk) >= CHUNK:
+                at = WriteAt(fd, chunk, at)
+                chunk.clear()
+    WriteAt(fd, chunk, at)
+    return HEADER.size + RECORD.size * n + 4 * first
+
+
+class SpillingFrontier(Frontier):
+    # PriorityFrontier (or FIFO, with every cost 0) holding at most limit programs in memory:
+    # past that, all but the limit // 2 first ones go to a run on disk. Past MAX_RUNS runs,
+    # the FANIN with the fewest programs left are merged into one, which bounds the open files
+    # and, as in a log-structured merge, writes each program O(log runs) times
+    def __init__(self, order, Rules, seen, normalizer=None, limit=1 << 20, directory=None):
+        Frontier.__init__(self, order, Rules, seen, normalizer)
+        self.limit = limit
+        self.directory = directory # None: the system's temporary directory
+        self.heap = []
+        self.seq = 0
+        self.runs = [] # live runs, and the ones drained since the last spill
+        self.heads = [] # (cost, seq, run index) of the next program of every live run
+        self.size = 0 # programs held on disk
+        self.byId = terms.RuleIndex(Rules)
+
+    def push(self, program, cost):
+        heapq.heappush(self.heap, (cost, self.seq, program)) # fifo costs are all 0, so this is push order
+        self.seq += 1
+        if len(self.heap) > self.limit:
+            self.spill()
+
+    def write(self, n, Entries):
+        fd, path = tempfile.mkstemp(prefix='frontier-', dir=self.directory)
+        os.unlink(path) # the descriptor, then the mapping, keep the data; nothing is left behind
+        try:
+            self.order.spillBytes += WriteRun(fd, n, Entries)
+            return Run(fd)
+        finally:
+            os.close(fd) # the mapping holds its own
+
+    def spill(self):
+        Entries = sorted(self.heap, key=lambda e: (e[0], e[1]))
+        keep = self.limit // 2
+        self.heap = Entries[:keep] # a sorted list is a heap
+        Spilled = Entries[keep:]
+        run = self.write(len(Spilled), ((cost, seq, array.array('i', terms.Derivation(program)))
+                                        for cost, seq, program in Spilled))
+        self.runs = [old for old in self.runs if old.index < old.n] + [run] # drained runs are closed already
+        self.order.spilled += run.n
+        self.order.runs += 1
+        self.size += run.n
+        if len(self.runs) > MAX_RUNS:
+            self.runs.sort(key=lambda r: r.n - r.index)
+            merged = self.runs[:FANIN]
+            run = self.write(sum(r.n - r.index for r in merged), heapq.merge(*[r.entries() for r in merged]))
+            for old in merged:
+                old.close()
+            self.runs = self.runs[FANIN:] + [run]
+            self.order.merges += 1
+        self.heads = [run.record(run.index)[:2] + (i,) for i, run in enumerate(self.runs)]
+        heapq.heapify(self.heads)
+
+    def pop(self):
+        if len(self.heads) > 0 and (len(self.heap) == 0 or self.heads[0][:2] < self.heap[0][:2]):
+            cost, seq, i = self.heads[0]
+            run = self.runs[i]
+            program = terms.Derive(self.order.grammar, self.Rules, run.path(run.index), self.byId)
+            run.index += 1
+            self.size -= 1
+            if run.index < run.n:
+                record = run.record(run.index)
+                heapq.heapreplace(self.heads, (record[0], record[1], i))
+            else:
+                heapq.heappop(self.heads) # the run stays in the list, drained, until the next spill
+                run.close()
+        else:
+            cost, seq, program = heapq.heappop(self.heap)
+        return program, cost
+
+    def __len__(self):
+        return len(self.heap) + self.size
+
+
+class Cursor:
+    # lazy stand-in for the children of one parent: only the next unseen child exists
+    __slots__ = ('parent', 'parentCost', 'rules', 'index', 'seq', 'nextChild', 'nextCost')
+
+    def advance(self, frontier):
+        self.nextChild = None
+        while self.index < len(self.rules):
+            rule = self.rules[self.index]
+            self.index += 1
+            child = self.parent.child(rule)
+            if frontier.fits(child) and frontier.seen.add(child.fp):
+                self.nextChild = child
+                self.nextCost = frontier.order.child(self.parentCost, rule, child)
+                return
+
+
+class LazyFrontier(Frontier):
+    # frontier of cursors: children are generated one at a time, when popped.
+    # Rules are tried cheapest first, so a cursor's children come out in cost
+    # order and the pop order is the same as with the eager frontiers.
+    def __init__(self, order, Rules, seen, normalizer=None):
+        Frontier.__init__(self, order, Rules, seen, normalizer)
+        self.fifo = order.order == 'fifo'
+        self.queue = collections.deque() if self.fifo else []
+        self.seq = 0
+        self.SortedRules = [sorted(rules, key=order.ruleCost) for rules in Rules]
+
+    def add(self, cursor, front):
+        if cursor.nextChild is None:
+            return
+        if self.fifo:
+            if front: # siblings stay ahead of the next generation, as in plain BFS
+                self.queue.appendleft(cursor)
+            else:
+                self.queue.append(cursor)
+        else:
+            heapq.heappush(self.queue, (cursor.nextCost, cursor.seq, cursor.index, cursor))
+
+    def push(self, program, cost):
+        cursor = Cursor()
+        cursor.rules = ()
+        cursor.index = 0
+        cursor.seq = self.seq
+        self.seq += 1
+        cursor.nextChild = program
+        cursor.nextCost = cost
+        self.add(cursor, False)
+
+    def expand(self, parent, parentCost):
+        cursor = Cursor()
+        cursor.parent = parent
+        cursor.parentCost = parentCost
+        cursor.rules = self.SortedRules[parent.nextHole()]
+        cursor.index = 0
+        cursor.seq = self.seq
+        self.seq += 1
+        cursor.advance(self)
+        self.add(cursor, False)
+
+    def pop(self):
+        cursor = self.queue.popleft() if self.fifo else heapq.heappop(self.queue)[3]
+        ret = cursor.nextChild, cursor.nextCost
+        cursor.advance(self)
+        self.add(cursor, True)
+        return ret
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class Ordering:
+    # fifo: expansion order; size: number of symbols, holes included;
+    # depth: nesting depth; weighted: sum of the weights of the applied productions;
+    # pcfg: -log2 likelihood plus the heuristic (Weights are then production counts, see pcfg.py).
+    # maxSize / maxDepth bound the complete programs the search may produce
+    def __init__(self, order, grammar, Weights=None, maxSize=None, maxDepth=None):
+        self.order = order
+        self.maxSize = maxSize
+        self.maxDepth = maxDepth
+        self.pruned = 0 # children dropped by the bounds
+        self.grammar = grammar
+        self.spill = None # (limit, directory): use a SpillingFrontier
+        self.spilled = 0 # programs it wrote to disk
+        self.runs = 0
+        self.merges = 0 # times it merged runs
+        self.spillBytes = 0 # written, merges included
+        Weights = Weights or {}
+        self.ProdWeight = [Weights.get(text, 1) for text in grammar.ProdText]
+        if order == 'pcfg':
+            Cost = pcfg.Costs(grammar, Weights)
+            self.Best = grammar.bestCosts(Cost)
+            self.start = grammar.Start
+            # cost of the production minus the heuristic of the hole it fills plus those of its new holes
+            self.ProdWeight = [Cost[p] + sum(self.Best[c] for c in grammar.children(p)) - self.Best[grammar.ProdNT[p]]
+                               for p in range(len(grammar.Productions))]
+
+    def frontier(self, Rules, seen, lazy=False, normalizer=None):
+        if lazy:
+            return LazyFrontier(self, Rules, seen, normalizer)
+        if self.spill is not None:
+            return SpillingFrontier(self, Rules, seen, normalizer, *self.spill)
+        if self.order == 'fifo':
+            return FifoFrontier(self, Rules, seen, normalizer)
+        return PriorityFrontier(self, Rules, seen, normalizer)
+
+    def ruleCost(self, rule):
+        # how much applying rule adds to the cost, for the orders where that only depends on the rule
+        if self.order == 'size':
+            return rule.size
+        if self.order == 'depth':
+            return rule.depth
+        if self.order == 'weighted' or self.order == 'pcfg':
+            return self.ProdWeight[rule.id]
+        return 0
+
+    def initial(self, program):
+        if self.order == 'size':
+            return program.size
+        if self.order == 'depth':
+            return program.depth
+        if self.order == 'weighted' or self.order == 'pcfg':
+            # a start past the root (e.g. a worker's shard) costs what its derivation applied
+            cost = self.Best[self.start] if self.order == 'pcfg' else 0 # pcfg: the rules' costs telescope to g + h
+            applied = program.applied
+            while applied is not None:
+                cost += self.ProdWeight[applied[0].id]
+                applied = applied[1]
+            return cost
+        return 0
+
+    def child(self, parentCost, rule, program):
+        if self.order == 'size':
+            return parentCost + rule.size - 1
+        if self.order == 'depth':
+            return program.depth
+        if self.order == 'weighted' or self.order == 'pcfg':
+            return parentCost + self.ProdWeight[rule.id]
+        return 0
+
+
+def ReadWeights(path):
+    # {"(+ Start Start)": 2.5, "x": 1, ...}, keyed by the production as written in the grammar
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,289 @@
+# Grammar compiler: the synth-fun grammar (SynFunExpr[4]) as dense integer
+# tables. Nonterminals and productions get ids; per production we record its
+# nonterminal, arity, child nonterminals, size and nesting depth, and per
+# nonterminal its sort and the size of its smallest complete derivation.
+# The start symbol is the first nonterminal of the synth-fun's return sort.
+# The analysis tables (productive and reachable nonterminals, minimum size and
+# depth, programs per size) let the engines drop partial programs that can
+# never be completed, or not within a size/depth bound.
+# With constants=True the integer literals of a nonterminal (two or more of
+# them, or a (Constant Int) production) become a single leaf @NT whose value
+# is solved for later; Constants maps each such leaf to its allowed values.
+import array
+import translator
+
+INFINITY = 1 << 30
+
+
+def Literal(Expr):
+    # ('Int', 0) -> '0', ('Bool', 1) -> 'true'
+    if type(Expr) == tuple:
+        if Expr[0] == 'Bool':
+            return 'true' if Expr[1] else 'false'
+        return str(Expr[1])
+    if type(Expr) == list:
+        return [Literal(e) for e in Expr]
+    return Expr
+
+def Template(Production, NTIndex, Holes):
+    # copy of Production with its nonterminals renamed to positional holes $0, $1, ...
+    # (the same nonterminal may occur twice, e.g. (+ Start Start)); Holes gets (nonterminal id, depth)
+    return TemplateAt(Production, NTIndex, Holes, 0)
+
+def TemplateAt(Production, NTIndex, Holes, depth):
+    if type(Production) == list:
+        if len(Production) == 1:
+            return TemplateAt(Production[0], NTIndex, Holes, depth)
+        return [Production[0]] + [TemplateAt(p, NTIndex, Holes, depth + 1) for p in Production[1:]]
+    if Production in NTIndex:
+        Holes.append((NTIndex[Production], depth))
+        return '$%d' % (len(Holes) - 1)
+    return Production
+
+def Fill(Template, Children):
+    if type(Template) == list:
+        return [Fill(t, Children) for t in Template]
+    if Template.startswith('$'):
+        return Children[int(Template[1:])]
+    return Template
+
+def Match(Template, Expr, Binds):
+    # whether Expr has the shape of Template; Binds gets hole number -> subterm
+    if type(Template) == list:
+        if type(Expr) != list or len(Expr) != len(Template):
+            return False
+        return all(Match(t, e, Binds) for t, e in zip(Template, Expr))
+    if Template.startswith('$'):
+        Binds[int(Template[1:])] = Expr
+        return True
+    return Template == Expr
+
+def Atoms(Expr):
+    if type(Expr) == list:
+        return sum(Atoms(e) for e in Expr)
+    return 1
+
+def Depth(Expr):
+    if type(Expr) == list:
+        return 1 + max(Depth(e) for e in Expr[1:])
+    return 0
+
+
+class Grammar:
+    def __init__(self, SynFunExpr, constants=False):
+        self.FunName = SynFunExpr[1]
+        self.ArgList = SynFunExpr[2]
+        self.RetSort = SynFunExpr[3]
+        NonTerms = SynFunExpr[4]
+        self.NTNames = [NT[0] for NT in NonTerms]
+        self.NTSorts = [NT[1] for NT in NonTerms]
+        self.NTIndex = {self.NTNames[i]: i for i in range(len(NonTerms))}
+        self.Start = self.NTSorts.index(self.RetSort)
+        self.Constants = {} # constant leaf -> sorted allowed values, or None for any integer
+
+        self.ProdStart = array.array('i') # productions of nonterminal n are ProdStart[n] .. ProdStart[n+1]-1
+        self.ProdNT = array.array('i')
+        self.ProdArity = array.array('i')
+        self.ProdChildStart = array.array('i') # children of production p are ProdChildren[ProdChildStart[p] .. ProdChildStart[p+1]-1]
+        self.ProdChildren = array.array('i')
+        self.ProdHoleDepth = array.array('i') # depth of each child hole inside its production
+        self.ProdSize = array.array('i') # symbols in the production, holes included
+        self.ProdDepth = array.array('i')
+        self.Productions = [] # the production as written, literals turned into strings
+        self.Templates = [] # the production with holes renamed $0, $1, ...
+        self.ProdText = []
+        for n in range(len(NonTerms)):
+            self.ProdStart.append(len(self.Productions))
+            Productions = NonTerms[n][2]
+            if constants:
+                Productions = self.collapse(NonTerms[n][0], Productions)
+            for production in Productions:
+                production = Literal(production)
+                Holes = []
+                self.ProdNT.append(n)
+                self.ProdChildStart.append(len(self.ProdChildren))
+                self.Templates.append(Template(production, self.NTIndex, Holes))
+                for nt, depth in Holes:
+                    self.ProdChildren.append(nt)
+                    self.ProdHoleDepth.append(depth)
+                self.ProdArity.append(len(Holes))
+                self.ProdSize.append(Atoms(self.Templates[-1]))
+                self.ProdDepth.append(Depth(self.Templates[-1]))
+                self.Productions.append(production)
+                self.ProdText.append(translator.toString(production))
+        self.ProdStart.append(len(self.Productions))
+        self.ProdChildStart.append(len(self.ProdChildren))
+
+        self.MinSize = self.minSizes()
+        self.MinDepth = self.minDepths()
+        self.Productive = [self.MinSize[n] < INFINITY for n in range(len(self.NTNames))]
+        self.Reachable = self.reachable()
+        # what a production adds at least to the size and depth of the hole it fills
+        self.ProdMinSize = array.array('i', [self.minSize(p) for p in range(len(self.Productions))])
+        self.ProdMinDepth = array.array('i', [self.minDepth(p) for p in range(len(self.Productions))])
+        self.Counts = [[0] for n in range(len(self.NTNames))] # Counts[n][s]: complete programs of size s derived from n
+
+    def collapse(self, NT, Productions):
+        # the integer literals of NT replaced by one constant leaf, if there is more than one of them
+        Ints = [p[1] for p in Productions if type(p) == tuple and p[0] == 'Int']
+        Any = [p for p in Productions if p == ['Constant', 'Int']]
+        if len(Ints) < 2 and len(Any) == 0:
+            return Productions
+        leaf = '@' + NT # not '?', which the normalizer uses for holes
+        self.Constants[leaf] = None if len(Any) > 0 else sorted(set(Ints))
+        Rest = [p for p in Productions if not (type(p) == tuple and p[0] == 'Int') and p != ['Constant', 'Int']]
+        return Rest + [leaf]
+
+    def productions(self, n):
+        return range(self.ProdStart[n], self.ProdStart[n+1])
+
+    def children(self, p):
+        return self.ProdChildren[self.ProdChildStart[p]:self.ProdChildStart[p+1]]
+
+    def holeDepths(self, p):
+        return self.ProdHoleDepth[self.ProdChildStart[p]:self.ProdChildStart[p+1]]
+
+    def useful(self, p):
+        # the production can be part of a complete program
+        return all(self.Productive[c] for c in self.children(p))
+
+    def minSize(self, p):
+        return min(self.ProdSize[p] - self.ProdArity[p] + sum(self.MinSize[c] for c in self.children(p)), INFINITY)
+
+    def minDepth(self, p):
+        depth = self.ProdDepth[p]
+        for c, d in zip(self.children(p), self.holeDepths(p)):
+            depth = max(depth, d + self.MinDepth[c])
+        return min(depth, INFINITY)
+
+    def minSizes(self):
+        # fixpoint of MinSize[n] = min over productions of own symbols + MinSize of the children
+        MinSize = array.array('i', [INFINITY] * len(self.NTNames))
+        changed = True
+        while changed:
+            changed = False
+            for p in range(len(self.Productions)):
+                size = self.ProdSize[p] - self.ProdArity[p]
+                for c in self.children(p):
+                    size += MinSize[c]
+                size = min(size, INFINITY)
+                if size < MinSize[self.ProdNT[p]]:
+                    MinSize[self.ProdNT[p]] = size
+                    changed = True
+        return MinSize
+
+    def bestCosts(self, Cost):
+        # fixpoint of Best[n] = min over productions of Cost[p] + Best of the children,
+        # the cheapest complete derivation of each nonterminal under per-production costs >= 0
+        Best = [float('inf')] * len(self.NTNames)
+        changed = True
+        while changed:
+            changed = False
+            for p in range(len(self.Productions)):
+                cost = Cost[p] + sum(Best[c] for c in self.children(p))
+                if cost < Best[self.ProdNT[p]]:
+                    Best[self.ProdNT[p]] = cost
+                    changed = True
+        return Best
+
+    def derive(self, Expr, n=None, active=()):
+        # production ids of a leftmost derivation of the program Expr from n (the start symbol by default), or None;
+        # active holds the (nonterminal, subterm) pairs being derived, so chain cycles are not followed
+        if n is None:
+            n = self.Start
+        if (n, id(Expr)) in active:
+            return None
+        active = active + ((n, id(Expr)),)
+        for p in self.productions(n):
+            Binds = {}
+            if not Match(self.Templates[p], Expr, Binds):
+                continue
+            ret = [p]
+            for i, c in enumerate(self.children(p)):
+                sub = self.derive(Binds[i], c, active)
+                if sub is None:
+                    break
+                ret += sub
+            else:
+                return ret
+        return None
+
+    def minDepths(self):
+        # same fixpoint for the depth: a hole at depth d of a production adds d to its subterm's depth
+        MinDepth = array.array('i', [INFINITY] * len(self.NTNames))
+        changed = True
+        while changed:
+            changed = False
+            for p in range(len(self.Productions)):
+                depth = self.ProdDepth[p]
+                for c, d in zip(self.children(p), self.holeDepths(p)):
+                    depth = max(depth, min(d + MinDepth[c], INFINITY))
+                if depth < MinDepth[self.ProdNT[p]]:
+                    MinDepth[self.ProdNT[p]] = depth
+                    changed = True
+        return MinDepth
+
+    def reachable(self):
+        # nonterminals that occur in some derivation from Start through useful productions
+        Reachable = [False] * len(self.NTNames)
+        Reachable[self.Start] = True
+        stack = [self.Start]
+        while len(stack) > 0:
+            n = stack.pop()
+            for p in self.productions(n):
+                if not self.useful(p):
+                    continue
+                for c in self.children(p):
+                    if not Reachable[c]:
+                        Reachable[c] = True
+                        stack.append(c)
+        return Reachable
+
+    def counts(self, maxSize):
+        # Counts[n][s] for every s <= maxSize; a program of size s only has children smaller than s,
+        # so the table is filled size by size and kept for later calls
+        # chain productions (Start -> B) keep the size, so they are resolved by repeating the
+        # sum over them; a cycle of them is only followed len(NTNames) times
+        Chains = [p for p in range(len(self.Productions)) if self.ProdSize[p] == self.ProdArity[p]]
+        for s in range(len(self.Counts[0]), maxSize + 1):
+            Base = [0] * len(self.NTNames)
+            for p in range(len(self.Productions)):
+                if self.ProdSize[p] > self.ProdArity[p]:
+                    Base[self.ProdNT[p]] += self.productionCount(p, s)
+            for n in range(len(self.NTNames)):
+                self.Counts[n].append(Base[n])
+            for i in range(len(self.NTNames) if len(Chains) > 0 else 0):
+                Level = list(Base)
+                for p in Chains:
+                    Level[self.ProdNT[p]] += self.Counts[self.children(p)[0]][s]
+                for n in range(len(self.NTNames)):
+                    self.Counts[n][s] = Level[n]
+        return self.Counts
+
+    def exhausted(self, size):
+        # whether no reachable nonterminal derives a program of more than size symbols: if M is the
+        # largest size with a program so far, the smallest larger program only has children of at
+        # most M symbols, so it has at most arity * M plus its production's own symbols
+        Counts = self.counts(size)
+        NTs = [n for n in range(len(self.NTNames)) if self.Reachable[n]]
+        M = max([s for s in range(size + 1) if any(Counts[n][s] > 0 for n in NTs)] + [0])
+        bound = max(self.ProdArity[p] * M + self.ProdSize[p] - self.ProdArity[p]
+                    for p in range(len(self.Productions)) if self.Reachable[self.ProdNT[p]])
+        return bound <= size
+
+    def productionCount(self, p, size):
+        # complete programs of the given size whose top production is p (needs counts(size - 1))
+        rest = size - (self.ProdSize[p] - self.ProdArity[p])
+        if rest < 0:
+            return 0
+        return self.ways(list(self.children(p)), rest)
+
+    def ways(self, Children, total):
+        # ways to split total over programs of the Children nonterminals, each of size >= 1
+        if len(Children) == 0:
+            return 1 if total == 0 else 0
+        ret = 0
+        for s in range(self.MinSize[Children[0]], total - len(Children) + 2):
+            if self.Counts[Children[0]][s] > 0:
+                ret += self.Counts[Children[0]][s] * self.ways(Children[1:], total - s)
+        return ret
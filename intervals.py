@@ -0,0 +1,338 @@
+# Interval analysis of partial programs on the stored counter-examples. Ints
+# are intervals (lo, hi) with infinite ends allowed; Bools are intervals over
+# 0 (false) and 1 (true), so (0, 1) is "either". A hole stands for every
+# program its nonterminal derives: per input of the synth-fun, the range of
+# each nonterminal is a fixpoint over its productions (widened to infinity
+# once it keeps growing). If a partial program's range makes a spec false at
+# some stored point, no completion can pass that point and it is dropped.
+from evaluator import Literal, Undecided, smtDiv, smtMod
+
+INF = float('inf')
+TOP = (-INF, INF)
+TRUE = (1, 1)
+FALSE = (0, 0)
+EITHER = (0, 1)
+WIDEN = 3 # fixpoint rounds before growing ranges jump to infinity
+MEMO = 1 << 20 # subterm values kept
+
+
+def Exact(v):
+    return v[0] == v[1] and v[0] not in (INF, -INF)
+
+def Join(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+def Mul(x, y):
+    # 0 * inf is 0 here: an infinite end only stands for "unbounded"
+    if x == 0 or y == 0:
+        return 0
+    return x * y
+
+def Times(a, b):
+    corners = [Mul(x, y) for x in a for y in b]
+    return (min(corners), max(corners))
+
+def Bool(canFalse, canTrue):
+    return (0 if canFalse else 1, 1 if canTrue else 0)
+
+def Truth(v):
+    # True, False or None (either)
+    if v[0] >= 1:
+        return True
+    if v[1] <= 0:
+        return False
+    return None
+
+def Compare(op, a, b):
+    if op == '<=':
+        return Bool(a[1] > b[0], a[0] <= b[1])
+    if op == '<':
+        return Bool(a[1] >= b[0], a[0] < b[1])
+    if op == '>=':
+        return Compare('<=', b, a)
+    if op == '>':
+        return Compare('<', b, a)
+    # '=' is certain only on equal exact values, impossible on disjoint ranges
+    return Bool(not (Exact(a) and a == b), a[0] <= b[1] and b[0] <= a[1])
+
+def Chain(op, args):
+    ret = TRUE
+    for i in range(len(args) - 1):
+        ret = And(ret, Compare(op, args[i], args[i+1]))
+    return ret
+
+def And(a, b):
+    return Bool(Truth(a) is not True or Truth(b) is not True, Truth(a) is not False and Truth(b) is not False)
+
+def Not(a):
+    return (1 - a[1], 1 - a[0])
+
+def Apply(op, args):
+    if op == '+':
+        return (sum(a[0] for a in args), sum(a[1] for a in args))
+    if op == '-':
+        if len(args) == 1:
+            return (-args[0][1], -args[0][0])
+        ret = args[0]
+        for a in args[1:]:
+            ret = (ret[0] - a[1], ret[1] - a[0])
+        return ret
+    if op == '*':
+        ret = (1, 1)
+        for a in args:
+            ret = Times(ret, a)
+        return ret
+    if op == 'div' or op == 'mod':
+        a, b = args
+        if Exact(a) and Exact(b) and b[0] != 0:
+            v = (smtDiv if op == 'div' else smtMod)(a[0], b[0])
+            return (v, v)
+        if op == 'mod' and Exact(b) and b[0] != 0:
+            return (0, abs(b[0]) - 1)
+        return TOP
+    if op == 'abs':
+        lo, hi = args[0]
+        if lo >= 0:
+            return (lo, hi)
+        if hi <= 0:
+            return (-hi, -lo)
+        return (0, max(-lo, hi))
+    if op in ('<=', '<', '>=', '>', '='):
+        return Chain(op, args)
+    if op == 'distinct' and len(args) == 2:
+        return Not(Compare('=', args[0], args[1]))
+    if op == 'and':
+        ret = TRUE
+        for a in args:
+            ret = And(ret, a)
+        return ret
+    if op == 'or':
+        ret = FALSE
+        for a in args:
+            ret = Not(And(Not(ret), Not(a)))
+        return ret
+    if op == 'not':
+        return Not(args[0])
+    if op == '=>':
+        ret = args[-1]
+        for a in reversed(args[:-1]):
+            ret = Not(And(a, Not(ret)))
+        return ret
+    if op == 'xor':
+        a, b = args
+        if Exact(a) and Exact(b):
+            return TRUE if a != b else FALSE
+        return EITHER
+    return TOP
+
+def Abstract(Expr, Env, Funcs):
+    # like evaluator.Evaluate on intervals; Env maps names (variables, holes) to intervals
+    if type(Expr) == str:
+        if Expr in Env:
+            return Env[Expr]
+        try:
+            v = int(Literal(Expr))
+        except ValueError:
+            return TOP
+        return (v, v)
+    if type(Expr) == tuple:
+        v = int(Literal(Expr))
+        return (v, v)
+    if len(Expr) == 1:
+        return Abstract(Expr[0], Env, Funcs)
+    op = Expr[0]
+    if op == 'ite':
+        cond = Truth(Abstract(Expr[1], Env, Funcs))
+        if cond is True:
+            return Abstract(Expr[2], Env, Funcs)
+        if cond is False:
+            return Abstract(Expr[3], Env, Funcs)
+        return Join(Abstract(Expr[2], Env, Funcs), Abstract(Expr[3], Env, Funcs))
+    if op == 'and' or op == 'or' or op == '=>':
+        # short-circuit once the value is certain, as most specs are conjunctions of implications
+        ret = TRUE if op != 'or' else FALSE
+        last = len(Expr) - 1
+        for i in range(1, last + 1):
+            a = Abstract(Expr[i], Env, Funcs)
+            if op == '=>' and i < last:
+                a = Not(a)
+            if op == 'and':
+                ret = And(ret, a)
+            else:
+                ret = Not(And(Not(ret), Not(a)))
+            if Truth(ret) is (op != 'and'): # false for and, true for or and =>
+                return ret
+        return ret
+    args = [Abstract(e, Env, Funcs) for e in Expr[1:]]
+    if op in Funcs:
+        if callable(Funcs[op]):
+            return Funcs[op](*args)
+        argNames, body = Funcs[op]
+        return Abstract(body, dict(zip(argNames, args)), Funcs)
+    try:
+        return Apply(op, args)
+    except (Undecided, ValueError, OverflowError):
+        return TOP
+
+def Residual(Expr, Env, Funcs, name):
+    # Expr with everything that does not depend on the synth-fun name evaluated to intervals;
+    # what is left are lists [op, ...] over intervals and ['$call', inputs] for its applications
+    if type(Expr) != list:
+        return Abstract(Expr, Env, Funcs)
+    if len(Expr) == 1:
+        return Residual(Expr[0], Env, Funcs, name)
+    op = Expr[0]
+    args = [Residual(e, Env, Funcs, name) for e in Expr[1:]]
+    if op == name:
+        if all(type(a) == tuple and Exact(a) for a in args):
+            return ['$call', tuple(a[0] for a in args)]
+        return TOP
+    if op in Funcs and not callable(Funcs[op]):
+        argNames, body = Funcs[op]
+        return Residual(body, dict(zip(argNames, args)), Funcs, name)
+    if all(type(a) == tuple for a in args):
+        return Run([op] + args, None)
+    if op == '=>':
+        op, args = 'or', [Not(a) if type(a) == tuple else ['not', a] for a in args[:-1]] + [args[-1]]
+    if op == 'and' or op == 'or':
+        const = [a for a in args if type(a) == tuple]
+        rest = [a for a in args if type(a) != tuple]
+        folded = Run([op] + const, None)
+        if Truth(folded) is (op == 'or'):
+            return folded
+        if Truth(folded) is None:
+            rest.append(folded)
+        return [op] + rest
+    return [op] + args
+
+def Run(R, call):
+    # value of a residual, call(inputs) giving the synth-fun's interval on inputs
+    if type(R) == tuple:
+        return R
+    op = R[0]
+    if op == '$call':
+        return call(R[1])
+    if op == 'ite':
+        cond = Truth(Run(R[1], call))
+        if cond is True:
+            return Run(R[2], call)
+        if cond is False:
+            return Run(R[3], call)
+        return Join(Run(R[2], call), Run(R[3], call))
+    if op == 'and' or op == 'or':
+        ret = TRUE if op == 'and' else FALSE
+        for a in R[1:]:
+            a = Run(a, call)
+            ret = And(ret, a) if op == 'and' else Not(And(Not(ret), Not(a)))
+            if Truth(ret) is (op == 'or'):
+                return ret
+        return ret
+    try:
+        return Apply(op, [Run(a, call) for a in R[1:]])
+    except (Undecided, ValueError, OverflowError):
+        return TOP
+
+
+class IntervalPruner:
+    def __init__(self, grammar, cegisChecker):
+        self.grammar = grammar
+        self.cegisChecker = cegisChecker
+        self.argNames = [arg[0] for arg in grammar.ArgList]
+        self.Envs = {} # synth-fun input -> interval of each argument, constant leaf and nonterminal
+        self.Values = {} # (term, synth-fun input) -> interval; terms are hash-consed, so shared subterms hit
+        self.Residuals = {} # id of a stored point -> (point, its residual specs)
+        self.checked = 0 # partial programs evaluated
+        self.pruned = 0 # ... and dropped
+
+    def env(self, Inputs):
+        # the arguments' values and the interval of every program derived from each nonterminal,
+        # on one input of the synth-fun
+        if Inputs in self.Envs:
+            return self.Envs[Inputs]
+        grammar = self.grammar
+        Env = {name: (v, v) for name, v in zip(self.argNames, Inputs)}
+        for leaf, values in grammar.Constants.items():
+            Env[leaf] = TOP if values is None else (min(values), max(values))
+        Range = [None] * len(grammar.NTNames)
+        rounds = 0
+        while True: # ranges only grow, and once widened each end moves at most once more
+            changed = False
+            for n in range(len(grammar.NTNames)):
+                new = Range[n]
+                for p in grammar.productions(n):
+                    Holes = [Range[c] for c in grammar.children(p)]
+                    if any(h is None for h in Holes):
+                        continue
+                    Local = dict(Env)
+                    for i in range(len(Holes)):
+                        Local['$%d' % i] = Holes[i]
+                    new = Join(new, Abstract(grammar.Templates[p], Local, {}))
+                if new != Range[n] and rounds >= WIDEN and Range[n] is not None:
+                    new = (new[0] if new[0] >= Range[n][0] else -INF, new[1] if new[1] <= Range[n][1] else INF)
+                if new != Range[n]:
+                    Range[n] = new
+                    changed = True
+            if not changed:
+                break
+            rounds += 1
+        for n in range(len(grammar.NTNames)):
+            Env[grammar.NTNames[n]] = Range[n] if Range[n] is not None else TOP
+        self.Envs[Inputs] = Env
+        return Env
+
+    def value(self, term, Inputs):
+        # interval of a terms.Term (holes are nonterminal leaves) on one input
+        key = (term, Inputs)
+        ret = self.Values.get(key)
+        if ret is not None:
+            return ret
+        if len(term.args) == 0:
+            ret = Abstract(term.head, self.env(Inputs), {})
+        elif term.head == 'ite':
+            cond = Truth(self.value(term.args[0], Inputs))
+            if cond is None:
+                ret = Join(self.value(term.args[1], Inputs), self.value(term.args[2], Inputs))
+            else:
+                ret = self.value(term.args[1 if cond else 2], Inputs)
+        else:
+            try:
+                ret = Apply(term.head, [self.value(a, Inputs) for a in term.args])
+            except (Undecided, ValueError, OverflowError):
+                ret = TOP
+        if len(self.Values) >= MEMO:
+            self.Values.clear()
+        self.Values[key] = ret
+        return ret
+
+    def feasible(self, Program):
+        # False if some stored point makes a spec false for every completion of Program (a terms.Term)
+        checker = self.cegisChecker
+        if len(checker.points) == 0:
+            return True
+        self.checked += 1
+        call = lambda Inputs: self.value(Program, Inputs)
+        for point in checker.points:
+            for R in self.residuals(point):
+                if Truth(Run(R, call)) is False:
+                    self.pruned += 1
+                    return False
+        return True
+
+    def residuals(self, point):
+        # the specs at a stored point, reduced to what depends on the synth-fun (certainly true ones left out)
+        key = id(point)
+        if key not in self.Residuals or self.Residuals[key][0] is not point:
+            checker = self.cegisChecker
+            Env = {name: (int(v), int(v)) for name, v in point.items()}
+            Funcs = dict(checker.Funcs)
+            Rs = [Residual(spec, Env, Funcs, checker.synFunName) for spec in checker.Specs]
+            self.Residuals[key] = (point, [R for R in Rs if not (type(R) == tuple and Truth(R) is True)])
+        return self.Residuals[key][1]
+
+    def report(self):
+        rate = 100.0 * self.pruned / self.checked if self.checked > 0 else 0.0
+        return f'{self.checked} partial programs checked, {self.pruned} pruned ({rate:.1f}%)'
@@ -1,24 +1,22 @@
 import sys
+import argparse
 import sexp
 import pprint
 import translator
 import time
-
-
-def Extend(Stmts,Productions):
-    ret = []
-    for i in range(len(Stmts)):
-        if type(Stmts[i]) == list:
-            TryExtend = Extend(Stmts[i],Productions)
-            if len(TryExtend) > 0 :
-                for extended in TryExtend:
-                    ret.append(Stmts[0:i]+[extended]+Stmts[i+1:])
-        elif Stmts[i] in Productions:
-            for extended in Productions[Stmts[i]]:
-                ret.append(Stmts[0:i]+[extended]+Stmts[i+1:])
-        if len(ret) > 0:
-            break
-    return ret
+import cegis
+import bottomup
+import unify
+import frontier
+import terms
+import grammar
+import symmetry
+import normalizer
+import constants
+import parallel
+import intervals
+import feasibility
+import deepening
 
 
 def stripComments(bmFile):
@@ -29,83 +27,202 @@ def stripComments(bmFile):
     return noComments + ')'
 
 
-if __name__ == '__main__':
-    timeStart = time.time()
-
-    benchmarkFile = open(sys.argv[1])
+def ReadBenchmark(path):
+    benchmarkFile = open(path)
     bm = stripComments(benchmarkFile)
     bmExpr = sexp.sexp.parseString(bm, parseAll=True).asList()[0] #Parse string to python list
-    #pprint.pprint(bmExpr)
-    checker=translator.ReadQuery(bmExpr)
-    #print (checker.check('(define-fun f ((x Int)) Int (mod (* x 3) 10)  )'))
-    #raw_input()
     SynFunExpr = []
-    StartSym = 'My-Start-Symbol' #virtual starting symbol
     for expr in bmExpr:
         if len(expr)==0:
             continue
         elif expr[0]=='synth-fun':
             SynFunExpr=expr
-    FuncDefine = ['define-fun']+SynFunExpr[1:4] #copy function signature
-    #print(FuncDefine)
-    BfsQueue = [[StartSym]] #Top-down
-    Productions = {StartSym:[]}
-    Type = {StartSym:SynFunExpr[3]} # set starting symbol's return type
-
-    for NonTerm in SynFunExpr[4]: #SynFunExpr[4] is the production rules
-        NTName = NonTerm[0]
-        NTType = NonTerm[1]
-        if NTType == Type[StartSym]:
-            Productions[StartSym].append(NTName)
-        Type[NTName] = NTType;
-        #Productions[NTName] = NonTerm[2]
-        Productions[NTName] = []
-        for NT in NonTerm[2]:
-            if type(NT) == tuple:
-                Productions[NTName].append(str(NT[1])) # deal with ('Int',0). You can also utilize type information, but you will suffer from these tuples.
-            else:
-                Productions[NTName].append(NT)
+    return bmExpr, SynFunExpr
+
+
+POLL = 64
+
+
+def TopDownSearch(grammar,FuncDefine,check,order,seen,lazy=False,symmetry=None,normalizer=None,constants=None,starts=None,poll=None,pruners=()):
+    # check(Program) returns a counter-example or None; order is a frontier.Ordering,
+    # seen a terms.SeenSet shared by the whole search, symmetry an optional symmetry.Symmetry,
+    # normalizer an optional normalizer.Normalizer pruning partial programs,
+    # constants a constants.ConstantSolver when the grammar has constant leaves,
+    # pruners objects whose feasible(term) may drop a partial program before it is expanded
+    # (intervals.IntervalPruner, feasibility.FeasibilityChecker).
+    # starts: derivations (lists of production ids) to search below instead of the start symbol;
+    # poll() is called every POLL candidates and ends the search when it returns True
+    Rules = terms.CompileRules(grammar,symmetry)
+    BfsQueue = order.frontier(Rules,seen,lazy,normalizer) #Top-down
+    if starts is None:
+        starts = [[]]
+    for path in starts:
+        Start = terms.Derive(grammar,Rules,path)
+        BfsQueue.push(Start,order.initial(Start))
+        seen.add(Start.fp)
     Count = 0
+    Pops = 0
     while(len(BfsQueue)!=0):
-        Curr = BfsQueue.pop(0)
-        #print("Extending "+str(Curr))
-        TryExtend = Extend(Curr,Productions)
-        if(len(TryExtend)==0): # Nothing to extend
-            FuncDefineStr = translator.toString(FuncDefine,ForceBracket = True) # use Force Bracket = True on function definition. MAGIC CODE. DO NOT MODIFY THE ARGUMENT ForceBracket = True.
-            CurrStr = translator.toString(Curr)
-            #SynFunResult = FuncDefine+Curr
-            #Str = translator.toString(SynFunResult)
-            Str = FuncDefineStr[:-1]+' '+ CurrStr+FuncDefineStr[-1] # insert Program just before the last bracket ')'
+        Curr, CurrCost = BfsQueue.pop()
+        Pops += 1
+        if Pops % terms.RESET == 0: # terms are rebuilt from the partial programs, so none is needed after its pop
+            terms.Reset()
+        if Curr.holes == 0: # Nothing to extend
             Count += 1
-            # print (Count)
-            # print (Str)
-            # if Count % 100 == 1:
-                # print (Count)
-                # print (Str)
-                #raw_input()
-            #print '1'
-            counterexample = checker.check(Str)
-            #print counterexample
-            if(counterexample == None): # No counter-example
-                Ans = Str
+            if poll is not None and Count % POLL == 0 and poll():
                 break
-            #print '2'
-        #print(TryExtend)
-        #raw_input()
-        #BfsQueue+=TryExtend
-        TE_set = set()
-        for TE in TryExtend:
-            TE_str = str(TE)
-            if not TE_str in TE_set:
-                BfsQueue.append(TE)
-                TE_set.add(TE_str)
-
-    print(f'Time: {time.time() - timeStart}s', file=sys.stderr)
+            Program = terms.ToList(Curr.term(grammar))
+            if constants is not None:
+                Program = constants.complete(Program,check)
+                counterexample = None if Program is not None else True
+            else:
+                counterexample = check(Program)
+            if(counterexample == None): # No counter-example
+                terms.Reset()
+                return translator.DefineFunString(FuncDefine,Program), Count
+            continue
+        if len(pruners) > 0:
+            term = Curr.term(grammar)
+            if not all(pruner.feasible(term) for pruner in pruners):
+                continue # checked when popped rather than pushed: most pushed programs are never popped
+        BfsQueue.expand(Curr,CurrCost)
+    terms.Reset()
+    return None, Count
+
+
+def RunTopDown(args,Grammar,FuncDefine,checker,cegisChecker,starts=None,poll=None):
+    # the top-down search with the options in args; returns (answer, candidates, report lines)
+    order = frontier.Ordering(args.order,Grammar,frontier.ReadWeights(args.weights) if args.weights else None,args.max_size,args.max_depth)
+    if args.spill is not None:
+        order.spill = (args.spill,args.spill_dir)
+    check = cegisChecker.check if args.cegis else checker.checkProgram
+    seen = terms.SeenSet(args.seen_limit,args.bloom_bits)
+    symmetries = symmetry.Symmetry(Grammar) if args.symmetry else None
+    normal = normalizer.Normalizer(Grammar) if args.normalize != 'off' else None
+    if normal is not None:
+        check = normal.wrap(check)
+    # the kept form of a partial program may be one symmetry rejects once complete, which would drop
+    # the form symmetry keeps; with --symmetry only candidates are normalized
+    prune = normal if args.normalize == 'partial' and symmetries is None else None
+    solver = constants.ConstantSolver(Grammar,cegisChecker) if len(Grammar.Constants) > 0 else None
+    pruner = intervals.IntervalPruner(Grammar,cegisChecker) if args.intervals else None
+    smt = feasibility.FeasibilityChecker(Grammar,cegisChecker,args.feasibility,args.feasibility_budget) if args.feasibility > 0 else None
+    pruners = [p for p in (pruner,smt) if p is not None] # cheapest first
+    if args.engine == 'dfs':
+        engine = deepening.Deepening(Grammar,FuncDefine,check,symmetries,solver,args.max_size,pruners)
+        Ans = engine.search(starts,poll,POLL)
+        Count = engine.Count
+        Report = [f'Size bounds: up to {engine.bound}, {engine.skipped} without programs skipped']
+    else:
+        Ans, Count = TopDownSearch(Grammar,FuncDefine,check,order,seen,args.lazy,symmetries,prune,solver,starts,poll,pruners)
+        Report = [f'Duplicate programs skipped: {seen.duplicates}']
+    if args.spill is not None and args.engine != 'dfs':
+        Report.append(f'Frontier spilled: {order.spilled} programs in {order.runs} runs, {order.merges} merges, {order.spillBytes / 1e6:.1f} MB written')
+    if (args.max_size is not None or args.max_depth is not None) and args.engine != 'dfs':
+        Report.append(f'Partial programs out of bounds: {order.pruned}')
+    if args.max_size is not None:
+        Report.append(f'Programs up to size {args.max_size}: {sum(Grammar.counts(args.max_size)[Grammar.Start])}')
+    if solver is not None:
+        Report.append(f'Sketches: {solver.sketches}, without fitting constants: {solver.refuted}')
+    if normal is not None:
+        Report.append(f'Normal forms: {normal.skipped} candidates skipped, {normal.pruned} partial programs dropped')
+        if args.normalize == 'partial' and prune is None:
+            Report.append('Normal forms of partial programs not used together with --symmetry')
+    if symmetries is not None:
+        Report += [f'Symmetry {line}' for line in symmetries.report()]
+    if pruner is not None:
+        Report.append(f'Intervals: {pruner.report()}')
+    if smt is not None:
+        Report.append(f'Feasibility: {smt.report()}')
+    return Ans, Count, Report
+
+
+def Parser():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('benchmark')
+    argParser.add_argument('--engine', choices=['bfs','dfs','bottomup','unify'], default='bfs', help='search strategy (bottomup and unify always run in CEGIS mode; dfs does not take --order, --lazy, --spill, --seen-limit, --max-depth or --normalize partial)')
+    argParser.add_argument('--cegis', action='store_true', help='test candidates on cached counter-examples before calling Z3')
+    argParser.add_argument('--incremental', action='store_true', help='keep one solver with the spec asserted and push only each candidate\'s definition')
+    argParser.add_argument('--order', choices=['fifo','size','depth','weighted','pcfg'], default='fifo', help='frontier order of the top-down search')
+    argParser.add_argument('--weights', help='JSON file of production weights for --order weighted')
+    argParser.add_argument('--seen-limit', type=int, help='switch the global seen-set to a Bloom filter past this many programs')
+    argParser.add_argument('--bloom-bits', type=int, default=1 << 27, help='size of that Bloom filter in bits')
+    argParser.add_argument('--max-size', type=int, help='only enumerate programs of at most this many symbols')
+    argParser.add_argument('--max-depth', type=int, help='only enumerate programs of at most this nesting depth')
+    argParser.add_argument('--symmetry', action='store_true', help='enumerate only one argument order of commutative operators and skip redundant self-applications')
+    argParser.add_argument('--normalize', choices=['off','candidates','partial'], default='off', help='skip candidates whose normal form was already refuted (candidates), and also drop partial programs whose normal form was already queued (partial, not with --symmetry)')
+    argParser.add_argument('--constants', action='store_true', help='enumerate one symbolic constant per nonterminal instead of its integer literals and solve for it with Z3 (implies --cegis)')
+    argParser.add_argument('--intervals', action='store_true', help='drop partial programs that interval analysis refutes on a stored counter-example (implies --cegis)')
+    argParser.add_argument('--feasibility', type=int, default=0, help='ask Z3 whether partial programs up to this depth can be completed at all (implies --cegis)')
+    argParser.add_argument('--feasibility-budget', type=float, default=10.0, help='seconds those queries may take in total')
+    argParser.add_argument('--workers', type=int, default=1, help='split the top-down search over this many processes')
+    argParser.add_argument('--seed', type=int, help='random seed of Z3, which changes the counter-examples it returns')
+    argParser.add_argument('--spill', type=int, help='keep at most this many frontier programs in memory and write the rest to disk')
+    argParser.add_argument('--spill-dir', help='directory for those files (default: the temporary directory)')
+    argParser.add_argument('--lazy', action='store_true', help='keep one child generator per expanded program in the frontier instead of all its children (not with --spill)')
+    return argParser
+
+
+def Solve(args,bmExpr,SynFunExpr,timeStart):
+    # runs the configuration in args on a parsed benchmark; returns (answer, report lines)
+    if args.lazy and args.spill is not None:
+        raise ValueError('--lazy cannot be combined with --spill: the lazy frontier keeps all its generators in memory')
+    if args.engine == 'dfs':
+        Unsupported = [name for name, given in (('--order', args.order != 'fifo'), ('--lazy', args.lazy), ('--spill', args.spill is not None),
+                                                ('--seen-limit', args.seen_limit is not None), ('--max-depth', args.max_depth is not None),
+                                                ('--normalize partial', args.normalize == 'partial')) if given]
+        if len(Unsupported) > 0:
+            raise ValueError('--engine dfs keeps no frontier and does not take %s' % ', '.join(Unsupported))
+    if args.engine == 'bottomup' or args.engine == 'unify' or args.constants or args.intervals or args.feasibility > 0 or args.workers > 1:
+        args.cegis = True
+    if args.seed is not None:
+        translator.SetSeed(args.seed)
+    Report = []
+    #pprint.pprint(bmExpr)
+    checker=translator.ReadQuery(bmExpr,incremental=args.incremental)
+    cegisChecker = cegis.CegisChecker(checker) if args.cegis else None
+    FuncDefine = ['define-fun']+SynFunExpr[1:4] #copy function signature
+    #print(FuncDefine)
+    Grammar = grammar.Grammar(SynFunExpr,constants=args.constants and args.engine in ('bfs','dfs'))
+
+    if args.engine == 'unify' and unify.IteProduction(Grammar) is None:
+        Report.append('No ite production to split cases with, enumerating bottom-up')
+        args.engine = 'bottomup'
+    if args.engine == 'unify' and not cegisChecker.singleInvocation():
+        Report.append('The spec applies the synth-fun to different arguments, enumerating bottom-up')
+        args.engine = 'bottomup'
+    if args.engine == 'bottomup':
+        engine = bottomup.BottomUp(Grammar,FuncDefine,cegisChecker)
+        Ans = engine.search()
+        Count = engine.Count
+    elif args.engine == 'unify':
+        engine = unify.Unify(Grammar,FuncDefine,cegisChecker)
+        Ans = engine.search()
+        Count = engine.Count
+        Report.append(f'Unification rounds: {engine.Rounds}')
+        if engine.Stopped is not None:
+            Report.append(f'Unification stopped: {engine.Stopped}')
+    elif args.workers > 1:
+        Ans, Count, winner = parallel.Search(args,Grammar,args.workers,checker,cegisChecker)
+        Report.append(f'Workers: {args.workers}, answer from worker {winner}')
+    else:
+        Ans, Count, Lines = RunTopDown(args,Grammar,FuncDefine,checker,cegisChecker)
+        Report += Lines
+
+    Report.append(f'Time: {time.time() - timeStart}s')
+    Report.append(f'Solver checks: {checker.checkCount}, solver time: {checker.solverTime:.3f}s')
+    if args.cegis:
+        Report.append(f'Candidates: {Count}, rejected on stored points: {cegisChecker.concreteRejects}, '
+                      f'solver calls: {cegisChecker.solverCalls}, counter-examples: {len(cegisChecker.points)}')
+    return Ans, Report
 
-    print(Ans)
 
-	# Examples of counter-examples    
-	# print (checker.check('(define-fun max2 ((x Int) (y Int)) Int 0)'))
-    # print (checker.check('(define-fun max2 ((x Int) (y Int)) Int x)'))
-    # print (checker.check('(define-fun max2 ((x Int) (y Int)) Int (+ x y))'))
-    # print (checker.check('(define-fun max2 ((x Int) (y Int)) Int (ite (<= x y) y x))'))
+if __name__ == '__main__':
+    timeStart = time.time()
+    args = Parser().parse_args()
+    bmExpr, SynFunExpr = ReadBenchmark(args.benchmark)
+    Ans, Report = Solve(args,bmExpr,SynFunExpr,timeStart)
+    for line in Report:
+        print(line, file=sys.stderr)
+
+    print(Ans)
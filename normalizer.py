@@ -0,0 +1,184 @@
+# Rewrite-based normal forms of candidates. Normalize folds constants and
+# applies a small rule set (identities, x - x, ite with equal branches, double
+# negation, mirrored comparisons, sorted operands of commutative operators)
+# and returns the result as nested tuples. Equal normal forms mean equal
+# functions, so a Normalizer can skip candidates whose normal form was already
+# refuted, and drop partial programs whose normal form was already queued.
+# Normal forms are only used as keys; they never reach the output.
+from evaluator import Operators, Undecided
+import evaluator
+import terms
+
+Identity = {'+': '0', '*': '1', 'and': 'true', 'or': 'false'}
+Absorbing = {'*': '0', 'and': 'false', 'or': 'true'}
+Mirror = {'>=': '<=', '>': '<'}
+Negation = {'<=': '<', '<': '<='} # (not (<= a b)) is (< b a)
+
+
+def IsConst(Expr):
+    if type(Expr) != str:
+        return False
+    if Expr == 'true' or Expr == 'false':
+        return True
+    return Expr.lstrip('-').isdigit()
+
+def Value(Expr):
+    if type(Expr) == bool:
+        return 'true' if Expr else 'false'
+    return str(Expr)
+
+def Order(Args):
+    return sorted(Args, key=repr)
+
+
+def Normalize(Expr):
+    # nested-list program -> normal form; leaves starting with '?' are holes, each of them occurs once
+    if type(Expr) == tuple:
+        return Value(evaluator.Literal(Expr))
+    if type(Expr) == str:
+        return Value(evaluator.Literal(Expr)) if IsConst(Expr) else Expr
+    if len(Expr) == 1:
+        return Normalize(Expr[0])
+    return Rewrite(Expr[0], [Normalize(e) for e in Expr[1:]])
+
+def Rewrite(op, args):
+    if op in Mirror:
+        return Rewrite(Mirror[op], list(reversed(args)))
+    if op == '=>' and len(args) == 2:
+        return Rewrite('or', [Rewrite('not', [args[0]]), args[1]])
+    if op == 'distinct' and len(args) == 2:
+        return Rewrite('not', [Rewrite('=', args)])
+    if op in Identity:
+        flat = []
+        for a in args: # associative: (+ (+ a b) c) is (+ a b c)
+            if type(a) == tuple and a[0] == op:
+                flat += a[1:]
+            else:
+                flat.append(a)
+        consts = [a for a in flat if IsConst(a)]
+        rest = [a for a in flat if not IsConst(a)]
+        if len(consts) > 0:
+            try:
+                folded = Value(Fold(op, [evaluator.Literal(c) for c in consts]))
+            except Undecided:
+                folded = None
+            if folded is not None:
+                if folded == Absorbing.get(op):
+                    return folded
+                consts = [] if folded == Identity[op] else [folded]
+        if op == 'and' or op == 'or': # idempotent
+            rest = list(dict.fromkeys(rest))
+        args = Order(rest) + consts
+        if len(args) == 0:
+            return Identity[op]
+        if len(args) == 1:
+            return args[0]
+        return (op,) + tuple(args)
+    if op == '-' and len(args) == 2:
+        a, b = args
+        if a == b:
+            return '0'
+        if b == '0':
+            return a
+        if a == '0':
+            return Rewrite('-', [b])
+    if op == '-' and len(args) == 1 and type(args[0]) == tuple and args[0][0] == '-' and len(args[0]) == 2:
+        return args[0][1]
+    if op == 'ite':
+        c, a, b = args
+        if c == 'true':
+            return a
+        if c == 'false':
+            return b
+        if a == b:
+            return a
+        if type(c) == tuple and c[0] == 'not':
+            return ('ite', c[1], b, a)
+        return ('ite', c, a, b)
+    if op == 'not':
+        a = args[0]
+        if type(a) == tuple and a[0] == 'not':
+            return a[1]
+        if type(a) == tuple and a[0] in Negation and len(a) == 3:
+            return Rewrite(Negation[a[0]], [a[2], a[1]])
+    if op == '=' and len(args) == 2:
+        if args[0] == args[1]:
+            return 'true'
+        args = Order(args)
+    if (op == '<=' or op == '<') and len(args) == 2 and args[0] == args[1]:
+        return 'true' if op == '<=' else 'false'
+    if all(IsConst(a) for a in args) and op in Operators:
+        try:
+            return Value(Operators[op](*[evaluator.Literal(a) for a in args]))
+        except Undecided:
+            pass
+    return (op,) + tuple(args)
+
+def IsHole(Expr):
+    return type(Expr) == str and Expr.startswith('?')
+
+def Fold(op, values):
+    if op == '+':
+        return sum(values)
+    if op == '*':
+        return evaluator.smtMul(*values)
+    if op == 'and':
+        return all(values)
+    return any(values)
+
+
+class Normalizer:
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.refuted = set() # normal forms of candidates the checker rejected
+        self.forms = set() # normal forms of partial programs already queued
+        self.skipped = 0 # candidates not checked
+        self.pruned = 0 # partial programs dropped
+
+    def key(self, Program):
+        # normal form with every hole (nonterminal leaf) and every constant leaf a distinct '?' variable,
+        # then renumbered in order; two occurrences of one constant leaf may take different values
+        count = [0]
+        def holes(Expr):
+            if type(Expr) == list:
+                return [holes(e) for e in Expr]
+            if Expr in self.grammar.NTIndex or Expr in self.grammar.Constants:
+                count[0] += 1
+                return '?%s:%d' % (Expr, count[0])
+            return Expr
+        form = Normalize(holes(Program))
+        if count[0] == 0:
+            return form
+        names = {}
+        def renumber(Expr):
+            if type(Expr) == tuple:
+                return tuple(renumber(e) for e in Expr)
+            if IsHole(Expr):
+                if Expr not in names:
+                    names[Expr] = '%s:%d' % (Expr.split(':')[0], len(names))
+                return names[Expr]
+            return Expr
+        return renumber(form)
+
+    def wrap(self, check):
+        # check(Program) that skips programs equal to one check already rejected
+        def normalized(Program):
+            form = self.key(Program)
+            if form in self.refuted:
+                self.skipped += 1
+                return True
+            counterexample = check(Program)
+            if counterexample is not None:
+                self.refuted.add(form)
+            return counterexample
+        return normalized
+
+    def fresh(self, partial):
+        # False if a partial program with the same normal form was queued before
+        form = self.key(terms.ToList(partial.term(self.grammar)))
+        if form in self.forms:
+            self.pruned += 1
+            return False
+        self.forms.add(form)
+        return True
+
@@ -0,0 +1,132 @@
+# Sharded top-down search on several processes. The parent expands the start
+# symbol breadth-first until there are a few partial programs per worker and
+# deals them out by the number of programs below each one (from the grammar's
+# count tables; largest first, to the least loaded worker). Each worker runs
+# the usual top-down search below its shards, sends the counter-examples it
+# finds to every other worker, and the first verified answer stops them all.
+import heapq
+import queue
+import multiprocessing
+import terms
+import symmetry
+
+SHARDS_PER_WORKER = 4
+LOOKAHEAD = 8 # shards are weighed by their completions up to this many extra symbols
+
+
+def Shards(grammar, args, workers):
+    # derivations (lists of production ids) that partition the search space
+    Rules = terms.CompileRules(grammar, symmetry.Symmetry(grammar) if args.symmetry else None)
+    level = [terms.StartPartial(grammar)]
+    while len(level) < workers * SHARDS_PER_WORKER:
+        expanded = []
+        for partial in level:
+            if partial.holes == 0:
+                expanded.append(partial)
+            else:
+                expanded += [child for rule, child in partial.expand(Rules) if not child.rejected]
+        if len(expanded) == len(level):
+            break
+        level = expanded
+    return level
+
+def Weight(grammar, partial):
+    holes = []
+    pending = partial.pending
+    while pending is not None:
+        if pending[0][0] >= 0:
+            holes.append(pending[0][0])
+        pending = pending[1]
+    grammar.counts(LOOKAHEAD)
+    return sum(grammar.ways(holes, total) for total in range(LOOKAHEAD + 1))
+
+def Deal(grammar, shards, workers):
+    # longest processing time first: the heaviest shard goes to the least loaded worker
+    load = [(0, i) for i in range(workers)]
+    ret = [[] for i in range(workers)]
+    for shard in sorted(shards, key=lambda partial: -Weight(grammar, partial)):
+        weight, i = heapq.heappop(load)
+        ret[i].append(terms.Derivation(shard))
+        heapq.heappush(load, (weight + Weight(grammar, shard), i))
+    return ret
+
+
+def Worker(index, args, paths, inboxes, results, found):
+    import main
+    import translator
+    import cegis
+    import grammar
+    bmExpr, SynFunExpr = main.ReadBenchmark(args.benchmark)
+    if args.seed is not None:
+        translator.SetSeed(args.seed)
+    checker = translator.ReadQuery(bmExpr, incremental=args.incremental)
+    cegisChecker = cegis.CegisChecker(checker)
+    Found = [] # counter-examples of this worker's own solver calls
+    def share(point):
+        Found.append(point)
+        for i in range(len(inboxes)):
+            if i != index:
+                inboxes[i].put(point)
+    cegisChecker.onCounterexample = share
+    def poll():
+        while True:
+            try:
+                cegisChecker.addPoint(inboxes[index].get_nowait())
+            except queue.Empty:
+                break
+        return found.is_set()
+    Grammar = grammar.Grammar(SynFunExpr, constants=args.constants)
+    FuncDefine = ['define-fun'] + SynFunExpr[1:4]
+    Ans, Count, Report = main.RunTopDown(args, Grammar, FuncDefine, checker, cegisChecker, paths, poll)
+    if Ans is not None:
+        found.set()
+    results.put((index, Ans, Count, checker.checkCount, checker.solverTime, cegisChecker.solverCalls, cegisChecker.concreteRejects, Found))
+
+
+def Search(args, grammar, workers, checker, cegisChecker):
+    # -> (answer, candidates checked by the workers that reported, index of the winning worker);
+    # their solver and rejection counts and counter-examples are added to checker and cegisChecker
+    context = multiprocessing.get_context('spawn') # workers build their own Z3 context
+    Assigned = [paths for paths in Deal(grammar, Shards(grammar, args, workers), workers) if len(paths) > 0]
+    inboxes = [context.Queue() for paths in Assigned]
+    results = context.Queue()
+    found = context.Event()
+    processes = [context.Process(target=Worker, args=(i, args, Assigned[i], inboxes, results, found), daemon=True)
+                 for i in range(len(Assigned))]
+    for p in processes:
+        p.start()
+    Ans = None
+    winner = None
+    Count = 0
+    reported = set()
+    while len(reported) < len(processes):
+        try:
+            index, ans, count, checks, solverTime, solverCalls, rejects, Found = results.get(timeout=1)
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes) and results.empty():
+                break # a worker died without reporting
+            continue
+        reported.add(index)
+        Count += count
+        checker.checkCount += checks
+        checker.solverTime += solverTime
+        cegisChecker.solverCalls += solverCalls
+        cegisChecker.concreteRejects += rejects
+        for point in Found:
+            cegisChecker.addPoint(point)
+        if ans is not None:
+            Ans = ans
+            winner = index
+            break
+    # workers that exited without reporting, e.g. on an error in the spawned process (its traceback is on stderr)
+    failed = [(i, processes[i].exitcode) for i in range(len(processes))
+              if i not in reported and not processes[i].is_alive()]
+    found.set()
+    for p in processes:
+        p.join(1)
+        if p.is_alive():
+            p.terminate()
+    if Ans is None and len(failed) > 0:
+        raise RuntimeError('%d of %d workers failed (%s), their shards were not searched' %
+                           (len(failed), len(processes), ', '.join('worker %d: exit code %s' % f for f in failed)))
+    return Ans, Count, winner
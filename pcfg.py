@@ -0,0 +1,69 @@
+# Probabilistic grammar for the top-down search. Weights are counts of how
+# often each production (keyed by its text, e.g. "(+ Start Start)") occurs in
+# the derivations of known solutions; a grammar turns them into probabilities
+# per nonterminal, with add-one smoothing so unseen productions stay possible,
+# and a production costs -log2 of its probability. The cost of a program is
+# then -log2 of its likelihood, and the cheapest completion of each
+# nonterminal (grammar.bestCosts) is an admissible A* heuristic for the holes.
+#
+# Learning the weights from a batch run (lines "benchmark.sl<TAB>...<TAB>answer",
+# as portfolio.py --log writes them):
+#   python pcfg.py [-o weights.json] log.tsv ...
+import sys
+import math
+import json
+import argparse
+import collections
+import sexp
+import grammar
+
+
+def Costs(grammar, Weights=None):
+    # -log2 P(production | its nonterminal) for every production of grammar
+    Weights = Weights or {}
+    ret = [0.0] * len(grammar.Productions)
+    for n in range(len(grammar.NTNames)):
+        prods = grammar.productions(n)
+        total = sum(Weights.get(grammar.ProdText[p], 0) + 1 for p in prods)
+        for p in prods:
+            ret[p] = math.log2(total / (Weights.get(grammar.ProdText[p], 0) + 1))
+    return ret
+
+def Learn(Solutions):
+    # Solutions: (benchmark path, answer) pairs -> production text -> uses
+    from main import ReadBenchmark
+    Weights = collections.Counter()
+    for path, answer in Solutions:
+        bmExpr, SynFunExpr = ReadBenchmark(path)
+        Grammar = grammar.Grammar(SynFunExpr)
+        Define = grammar.Literal(sexp.sexp.parseString(answer, parseAll=True).asList()[0])
+        derivation = Grammar.derive(Define[4])
+        if derivation is None:
+            print(f'{path}: answer not derivable from the grammar, skipped', file=sys.stderr)
+            continue
+        for p in derivation:
+            Weights[Grammar.ProdText[p]] += 1
+    return Weights
+
+def ReadSolutions(path):
+    ret = []
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2 and fields[-1].startswith('(define-fun'):
+                ret.append((fields[0], fields[-1]))
+    return ret
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('logs', nargs='+')
+    argParser.add_argument('-o', '--output', default='weights.json')
+    args = argParser.parse_args()
+    Solutions = []
+    for path in args.logs:
+        Solutions += ReadSolutions(path)
+    Weights = Learn(Solutions)
+    with open(args.output, 'w') as f:
+        json.dump(dict(Weights.most_common()), f, indent=1)
+    print(f'{len(Solutions)} solutions, {len(Weights)} productions', file=sys.stderr)
@@ -0,0 +1,116 @@
+# Race several configurations of the synthesizer on one benchmark. Each
+# configuration is a string of main.py options ('--engine unify',
+# '--cegis --order size --seed 2', ...) and runs in its own process on the
+# benchmark parsed once here. Every engine only returns programs Z3 verified,
+# so the first answer wins and the other processes are killed. The winner is
+# reported on stderr and appended to --log as "benchmark<TAB>options<TAB>seconds<TAB>answer",
+# to tune the default portfolio per benchmark family (and, with pcfg.py, to
+# learn production weights from the answers).
+#
+#   python portfolio.py [--config OPTIONS ...] [--timeout S] [--log FILE] benchmark.sl
+#
+# OPTIONS may start with a dash even without a space in it (--config --cegis);
+# --config=OPTIONS works as well.
+import sys
+import time
+import queue
+import shlex
+import argparse
+import multiprocessing
+import main
+
+Default = [
+    '--cegis',
+    '--cegis --order size --symmetry',
+    '--engine unify',
+    '--engine bottomup',
+    '--constants --order size',
+]
+
+
+def Options(config, benchmark):
+    args = main.Parser().parse_args(shlex.split(config) + [benchmark])
+    if args.workers > 1:
+        raise ValueError('--workers cannot be used inside a portfolio: %s' % config)
+    return args
+
+def Attach(argv):
+    # '--config', 'OPTIONS' -> '--config=OPTIONS': argparse takes a lone value such as '--cegis' for an option
+    ret = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '--config' and i + 1 < len(argv):
+            ret.append('--config=' + argv[i + 1])
+            i += 2
+        else:
+            ret.append(argv[i])
+            i += 1
+    return ret
+
+def Run(index, args, bmExpr, SynFunExpr, results):
+    try:
+        Ans, Report = main.Solve(args, bmExpr, SynFunExpr, time.time())
+    except Exception as e:
+        Ans, Report = None, ['%s: %s' % (type(e).__name__, e)]
+    results.put((index, Ans, Report))
+
+
+def Race(Configs, path, timeout=None):
+    # -> (answer, index of the winning configuration or None, {index: report lines} of the finished ones)
+    Args = [Options(config, path) for config in Configs]
+    bmExpr, SynFunExpr = main.ReadBenchmark(path)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=Run, args=(i, Args[i], bmExpr, SynFunExpr, results), daemon=True)
+                 for i in range(len(Args))]
+    for p in processes:
+        p.start()
+    deadline = None if timeout is None else time.time() + timeout
+    Ans = None
+    winner = None
+    Reports = {}
+    while len(Reports) < len(processes):
+        if deadline is not None and time.time() > deadline:
+            break
+        try:
+            index, ans, Report = results.get(timeout=1)
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes) and results.empty():
+                break # a configuration died without reporting
+            continue
+        Reports[index] = Report
+        if ans is not None:
+            Ans = ans
+            winner = index
+            break
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
+    for p in processes:
+        p.join()
+    return Ans, winner, Reports
+
+
+if __name__ == '__main__':
+    timeStart = time.time()
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('benchmark')
+    argParser.add_argument('--config', action='append', help='main.py options of one configuration (repeat; default: %s)' % Default)
+    argParser.add_argument('--timeout', type=float, help='give up after this many seconds')
+    argParser.add_argument('--log', help='append the winning configuration to this file')
+    args = argParser.parse_args(Attach(sys.argv[1:]))
+    Configs = args.config or Default
+
+    Ans, winner, Reports = Race(Configs, args.benchmark, args.timeout)
+    elapsed = time.time() - timeStart
+    for index in sorted(Reports):
+        for line in Reports[index]:
+            print(f'[{Configs[index]}] {line}', file=sys.stderr)
+    if winner is None:
+        print(f'No configuration answered, time: {elapsed:.3f}s', file=sys.stderr)
+    else:
+        print(f'Winner: {Configs[winner]}, time: {elapsed:.3f}s', file=sys.stderr)
+        if args.log:
+            with open(args.log, 'a') as log:
+                log.write(f'{args.benchmark}\t{Configs[winner]}\t{elapsed:.3f}\t{Ans}\n')
+    print(Ans)
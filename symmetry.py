@@ -0,0 +1,108 @@
+# Symmetry breaking for the top-down search, driven by a table of algebraic
+# properties of the operators. It applies to productions of the shape
+# (op $0 $1) (or (ite $0 $1 $2) for the branches) whose compared holes share
+# one nonterminal; operands are compared by their derivations, i.e. the tuple
+# of production ids in pre-order, which is a total order on terms.
+#   commutative: the operands must come in order (A <= B)
+#   associative: a nested (op ...) may only be the left operand, and the right
+#                operand is then compared with the nested one's last operand,
+#                so chains of + or * are sorted left-leaning combs
+#   same:        (op A A) equals a constant or one of its operands; it is dropped
+#                when that constant is itself a production of the nonterminal
+#   mirror:      (op A B) is (op' B A); the later of the two productions is dropped
+import collections
+
+Properties = {
+    '+': {'commutative': True, 'associative': True},
+    '*': {'commutative': True, 'associative': True},
+    'and': {'commutative': True, 'associative': True, 'same': '$0'},
+    'or': {'commutative': True, 'associative': True, 'same': '$0'},
+    'xor': {'commutative': True, 'same': 'false'},
+    '=': {'commutative': True, 'same': 'true'},
+    '-': {'same': '0'},
+    '<=': {'mirror': '>=', 'same': 'true'},
+    '>=': {'mirror': '<=', 'same': 'true'},
+    '<': {'mirror': '>', 'same': 'false'},
+    '>': {'mirror': '<', 'same': 'false'},
+    'ite': {'same': '$1', 'operands': (1, 2)},
+}
+
+
+def Shape(Template, Properties):
+    # the compared hole positions if Template is (op $0 $1 ...) with a known op, else None
+    if type(Template) != list or Template[0] not in Properties:
+        return None
+    if Template[1:] != ['$%d' % i for i in range(len(Template) - 1)]:
+        return None
+    i, j = Properties[Template[0]].get('operands', (0, 1))
+    if j >= len(Template) - 1:
+        return None
+    return i, j
+
+
+class Symmetry:
+    def __init__(self, grammar, Properties=Properties):
+        self.grammar = grammar
+        self.Checks = {} # production -> (i, j, ordered, strict, associative)
+        self.Removed = {} # production -> the production it mirrors
+        self.Pruned = collections.Counter() # production -> partial programs rejected by its check
+        for n in range(len(grammar.NTNames)):
+            for p in grammar.productions(n):
+                tmpl = grammar.Templates[p]
+                holes = Shape(tmpl, Properties)
+                if holes is None:
+                    continue
+                i, j = holes
+                children = grammar.children(p)
+                if children[i] != children[j]:
+                    continue
+                props = Properties[tmpl[0]]
+                if 'mirror' in props:
+                    for q in grammar.productions(n):
+                        if q < p and grammar.Templates[q] == [props['mirror'], '$0', '$1'] and grammar.children(q) == children:
+                            self.Removed[p] = q
+                if p in self.Removed:
+                    continue
+                same = props.get('same')
+                strict = same is not None and (same.startswith('$') or
+                                               any(grammar.Productions[q] == same for q in grammar.productions(n)))
+                ordered = props.get('commutative', False)
+                if ordered or strict:
+                    self.Checks[p] = (i, j, ordered, strict, props.get('associative', False))
+
+    def split(self, ids, n):
+        # pre-order production ids of n sibling subterms -> one tuple per subterm
+        ret = []
+        k = 0
+        for s in range(n):
+            start = k
+            need = 1
+            while need > 0:
+                need += self.grammar.ProdArity[ids[k]] - 1
+                k += 1
+            ret.append(tuple(ids[start:k]))
+        return ret
+
+    def violates(self, p, ids):
+        # ids: the derivation of the holes of production p, once all of them are complete
+        i, j, ordered, strict, associative = self.Checks[p]
+        Subterms = self.split(ids, self.grammar.ProdArity[p])
+        A, B = Subterms[i], Subterms[j]
+        bad = False
+        if associative and B[0] == p:
+            bad = True
+        else:
+            if associative and A[0] == p:
+                A = self.split(A[1:], 2)[1]
+            bad = (ordered and A > B) or (strict and A == B)
+        if bad:
+            self.Pruned[p] += 1
+        return bad
+
+    def report(self):
+        ret = []
+        for p, q in sorted(self.Removed.items()):
+            ret.append('%s: removed, same as %s' % (self.grammar.ProdText[p], self.grammar.ProdText[q]))
+        for p in sorted(self.Checks):
+            ret.append('%s: %d pruned' % (self.grammar.ProdText[p], self.Pruned[p]))
+        return ret
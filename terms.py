@@ -0,0 +1,323 @@
+# Immutable, hash-consed terms for the top-down search. Terms are only built
+# through Make, which returns the existing node for an identical (head, args),
+# so equal terms are the same object, shared subterms are stored once and
+# equality is identity. A node caches a 64-bit structural fingerprint computed
+# from its children's fingerprints, its hole count, depth, size and string form.
+# The table keeps every node ever made; a search calls Reset() every RESET
+# programs and when it is done.
+
+MASK64 = (1 << 64) - 1
+RESET = 1 << 16 # programs between two clears of the term table, which would otherwise keep every program
+
+
+class Term:
+    __slots__ = ('head', 'args', 'fp', 'holes', 'depth', 'size', 'text')
+
+    def __str__(self):
+        if self.text is None:
+            if len(self.args) == 0:
+                self.text = self.head
+            else:
+                self.text = '(%s %s)' % (self.head, ' '.join(str(a) for a in self.args))
+        return self.text
+
+
+Interned = {} # fingerprint -> Term
+
+def Make(head, args=(), hole=False):
+    if len(args) == 0:
+        fp = hash((head,)) & MASK64
+    else:
+        fp = hash((head,) + tuple([a.fp for a in args])) & MASK64
+    term = Interned.get(fp)
+    if term is not None:
+        if term.head == head and term.args == args: # children are interned, so this compares pointers
+            return term
+        fp = None # 64-bit collision: keep this node out of the table
+    term = Term()
+    term.head = head
+    term.args = args
+    term.text = None
+    if len(args) == 0:
+        term.holes = 1 if hole else 0
+        term.depth = 0
+        term.size = 1
+    else:
+        holes = 0
+        depth = 0
+        size = 1
+        for a in args:
+            holes += a.holes
+            size += a.size
+            if a.depth > depth:
+                depth = a.depth
+        term.holes = holes
+        term.depth = depth + 1
+        term.size = size
+    if fp is None:
+        term.fp = hash((head,) + tuple([id(a) for a in args])) & MASK64
+    else:
+        term.fp = fp
+        Interned[fp] = term
+    return term
+
+def Reset():
+    # drop the intern table, e.g. between benchmarks; terms still alive stay valid but are no longer shared
+    Interned.clear()
+
+
+def ToList(term):
+    if len(term.args) == 0:
+        return term.head
+    return [term.head] + [ToList(a) for a in term.args]
+
+
+# Partial programs of the top-down search are zippers over the leftmost
+# derivation: the rules applied so far (newest first) and the stack of open
+# holes (leftmost first), both as persistent (head, tail) cons lists shared
+# with the parent. Expanding the next hole is O(1) plus the size of the new
+# rule; the program itself is only built as a Term once no hole is left.
+# A rule with a symmetry check also pushes a marker after its holes; when the
+# marker reaches the top of the stack its subterms are complete and checked.
+# The fingerprint is structural, a polynomial hash of the program's pre-order
+# symbols (head and arity, or the nonterminal of a hole): everything before
+# the leftmost hole is complete and kept as one hash, and each stack entry
+# caches the hash of its hole, the symbols after it up to the next hole and
+# the entries below. Filling the hole is then O(1) per new hole, and
+# programs reached by different derivations get the same fingerprint.
+
+BASE = 0x100000001b3
+
+def Token(head, arity):
+    return hash((head, arity)) & MASK64
+
+def HoleToken(NT):
+    return hash(('?', NT)) & MASK64
+
+def Symbols(Expr, out):
+    # pre-order tokens of a template, None for each hole
+    if type(Expr) == list:
+        out.append(Token(Expr[0], len(Expr) - 1))
+        for e in Expr[1:]:
+            Symbols(e, out)
+    elif Expr.startswith('$'):
+        out.append(None)
+    else:
+        out.append(Token(Expr, 0))
+    return out
+
+def Concat(h, p, tokens):
+    # (hash, BASE**length) of a token sequence extended by tokens
+    for t in tokens:
+        h = (h * BASE + t) & MASK64
+        p = p * BASE & MASK64
+    return h, p
+
+class Rule:
+    # one production of a grammar.Grammar, in the shape the zipper needs
+    __slots__ = ('id', 'NT', 'template', 'holes', 'size', 'depth', 'minSize', 'minDepth', 'extra', 'symmetry',
+                 'lead', 'segments')
+
+    def __init__(self, grammar, p, symmetry=None):
+        self.id = p
+        self.NT = grammar.ProdNT[p]
+        self.template = grammar.Templates[p]
+        self.holes = list(zip(grammar.children(p), grammar.holeDepths(p))) # (nonterminal id, depth), left to right
+        self.size = grammar.ProdSize[p]
+        self.depth = grammar.ProdDepth[p]
+        self.minSize = grammar.ProdMinSize[p]
+        self.minDepth = grammar.ProdMinDepth[p]
+        self.extra = self.minSize - grammar.MinSize[self.NT] # over the cheapest production of its nonterminal
+        self.symmetry = symmetry if symmetry is not None and p in symmetry.Checks else None
+        # fingerprint parts: (hash, power) of the symbols before the first hole, and per hole
+        # (nonterminal, depth, hole token, hash, power) of the symbols after it up to the next one
+        tokens = Symbols(self.template, [])
+        cut = [i for i in range(len(tokens)) if tokens[i] is None] + [len(tokens)]
+        self.lead = Concat(0, 1, tokens[:cut[0]])
+        self.segments = [(NT, depth, HoleToken(NT)) + Concat(0, 1, tokens[cut[i] + 1:cut[i + 1]])
+                         for i, (NT, depth) in enumerate(self.holes)]
+
+    def build(self, Expr, Children):
+        # Term for the production with hole $i replaced by Children[i]
+        if type(Expr) == list:
+            return Make(Expr[0], tuple(self.build(e, Children) for e in Expr[1:]))
+        if Expr.startswith('$'):
+            return Children[int(Expr[1:])]
+        return Make(Expr)
+
+def CompileRules(grammar, symmetry=None):
+    # nonterminal id -> [Rule]; productions with an unproductive child can never complete and are left out,
+    # as are those a symmetry.Symmetry removes
+    return [[Rule(grammar, p, symmetry) for p in grammar.productions(n)
+             if grammar.useful(p) and (symmetry is None or p not in symmetry.Removed)]
+            for n in range(len(grammar.NTNames))]
+
+
+class Partial:
+    # minSize / minDepth: smallest size and depth of any complete program it can still become
+    # rejected: some completed subterm breaks a symmetry check
+    # prefix: hash of the symbols before the leftmost hole; a stack entry is
+    # (nonterminal, depth, hash, power of the symbols after the hole, hash, power of the rest of the program)
+    # and a marker (-1, applied, 0, 1, hash, power)
+    __slots__ = ('applied', 'pending', 'prefix', 'holes', 'fp', 'size', 'depth', 'minSize', 'minDepth', 'rejected')
+
+    def nextHole(self):
+        return self.pending[0][0]
+
+    def child(self, rule):
+        # the program with its leftmost hole filled by rule
+        entry, rest = self.pending
+        NT, depth, tailHash, tailPower = entry[:4]
+        child = Partial()
+        child.applied = (rule, self.applied)
+        h, p = (0, 1) if rest is None else rest[0][4:]
+        prefix = (self.prefix * rule.lead[1] + rule.lead[0]) & MASK64
+        pending = rest
+        if rule.symmetry is not None:
+            pending = ((-1, child.applied, 0, 1, h, p), pending)
+        if len(rule.segments) == 0:
+            prefix = (prefix * tailPower + tailHash) & MASK64
+        last = len(rule.segments) - 1
+        for i in range(last, -1, -1):
+            hole, holeDepth, token, segHash, segPower = rule.segments[i]
+            if i == last: # the symbols after the filled hole now follow the rule's last hole
+                segHash = (segHash * tailPower + tailHash) & MASK64
+                segPower = segPower * tailPower & MASK64
+            h = ((token * segPower + segHash) * p + h) & MASK64
+            p = BASE * segPower * p & MASK64
+            pending = ((hole, depth + holeDepth, segHash, segPower, h, p), pending)
+        child.rejected = self.rejected
+        while pending is not None and pending[0][0] < 0:
+            mark = pending[0][1]
+            pending = pending[1]
+            if not child.rejected:
+                child.rejected = Rejected(child.applied, mark)
+        child.pending = pending
+        child.prefix = prefix
+        child.holes = self.holes - 1 + len(rule.holes)
+        h, p = (0, 1) if pending is None else pending[0][4:]
+        child.fp = (prefix * p + h) & MASK64
+        child.size = self.size - 1 + rule.size
+        child.depth = max(self.depth, depth + rule.depth)
+        child.minSize = self.minSize + rule.extra
+        child.minDepth = max(self.minDepth, depth + rule.minDepth)
+        return child
+
+    def expand(self, Rules):
+        # [(rule, child)] for every way to fill the leftmost hole
+        if self.pending is None:
+            return []
+        return [(rule, self.child(rule)) for rule in Rules[self.nextHole()]]
+
+    def term(self, grammar):
+        # replay the derivation (pre-order) into a Term; holes still open stay nonterminal leaves
+        rules = []
+        applied = self.applied
+        while applied is not None:
+            rules.append(applied[0])
+            applied = applied[1]
+        rules.reverse()
+        it = iter(rules)
+        def derive(NT):
+            rule = next(it, None)
+            if rule is None:
+                return Make(grammar.NTNames[NT], (), True)
+            return rule.build(rule.template, [derive(hole[0]) for hole in rule.holes])
+        return derive(rules[0].NT if len(rules) > 0 else self.pending[0][0])
+
+def StartPartial(grammar):
+    start = Partial()
+    start.applied = None
+    token = HoleToken(grammar.Start)
+    start.pending = ((grammar.Start, 0, 0, 1, token, BASE), None)
+    start.prefix = 0
+    start.holes = 1
+    start.fp = token
+    start.size = 1
+    start.depth = 0
+    start.minSize = grammar.MinSize[grammar.Start]
+    start.minDepth = grammar.MinDepth[grammar.Start]
+    start.rejected = False
+    return start
+
+def Rejected(applied, mark):
+    # run the symmetry check of the rule at the head of mark on the rules applied since
+    ids = []
+    while applied is not mark:
+        ids.append(applied[0].id)
+        applied = applied[1]
+    ids.reverse()
+    rule = mark[0]
+    return rule.symmetry.violates(rule.id, ids)
+
+def RuleIndex(Rules):
+    # production id -> Rule, for Rules from CompileRules
+    byId = {}
+    for rules in Rules:
+        for rule in rules:
+            byId[rule.id] = rule
+    return byId
+
+def Derive(grammar, Rules, path, byId=None):
+    # the partial program reached from the start symbol by applying the productions in path
+    # (production ids, leftmost hole first); Rules from CompileRules, byId its RuleIndex if at hand
+    if byId is None:
+        byId = RuleIndex(Rules)
+    partial = StartPartial(grammar)
+    for p in path:
+        partial = partial.child(byId[p])
+    return partial
+
+def Derivation(partial):
+    # inverse of Derive
+    ret = []
+    applied = partial.applied
+    while applied is not None:
+        ret.append(applied[0].id)
+        applied = applied[1]
+    ret.reverse()
+    return ret
+
+
+class SeenSet:
+    # global dedup over fingerprints; past `limit` entries the exact set is
+    # folded into a Bloom filter of `bits` bits, which bounds memory but may
+    # occasionally drop a program that was never seen (false positive)
+    def __init__(self, limit=None, bits=1 << 27, hashes=7):
+        self.limit = limit
+        self.exact = set()
+        self.bloom = None
+        self.bits = bits
+        self.hashes = hashes
+        self.duplicates = 0
+
+    def positions(self, fp):
+        h1 = fp & 0xffffffff
+        h2 = (fp >> 32) | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, fp):
+        # True if fp is new
+        if self.bloom is None:
+            if fp in self.exact:
+                self.duplicates += 1
+                return False
+            self.exact.add(fp)
+            if self.limit is not None and len(self.exact) > self.limit:
+                self.bloom = bytearray(self.bits // 8 + 1)
+                for old in self.exact:
+                    self.insert(old)
+                self.exact = None
+            return True
+        new = False
+        for p in self.positions(fp):
+            if not self.bloom[p >> 3] & (1 << (p & 7)):
+                new = True
+                self.bloom[p >> 3] |= 1 << (p & 7)
+        if not new:
+            self.duplicates += 1
+        return new
+
+    def insert(self, fp):
+        for p in self.positions(fp):
+            self.bloom[p >> 3] |= 1 << (p & 7)
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('numpy')
+import grammar
+import translator
+import cegis
+from bottomup import BottomUp
+from main import ReadBenchmark
+
+Benchmark = '''(set-logic LIA)
+(define-fun dbl ((a Int)) Int (+ a a))
+(synth-fun f ((x Int) (y Int)) Int
+    ((Start Int (x y 1 (dbl Start) (+ Start Start) (ite B Start Start)))
+     (B Bool ((<= Start Start)))))
+(declare-var x Int)
+(declare-var y Int)
+(constraint (= (f x y) (ite (<= x y) (+ (dbl y) 1) x)))
+(check-synth)
+'''
+
+
+def test_helper_define_fun_in_vectorized_mode(tmp_path):
+    path = tmp_path / 'f.sl'
+    path.write_text(Benchmark)
+    bmExpr, SynFunExpr = ReadBenchmark(str(path))
+    Grammar = grammar.Grammar(SynFunExpr)
+    FuncDefine = ['define-fun'] + SynFunExpr[1:4]
+    engine = BottomUp(Grammar, FuncDefine, cegis.CegisChecker(translator.ReadQuery(bmExpr)))
+    assert engine.vectorized
+    Sigs = {}
+    for NT, size, Program, Sig in engine.generate([(1, 2), (3, 0)]):
+        Sigs[str(Program)] = Sig
+        if size > 5:
+            break
+    assert Sigs["['dbl', 'y']"] == (4, 0)
+    assert Sigs["['dbl', ['dbl', 'x']]"] == (4, 12)
+    # (+ x x) equals (dbl x) on every input, so observational equivalence drops it
+    assert "['+', 'x', 'x']" not in Sigs
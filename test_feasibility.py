@@ -0,0 +1,33 @@
+import grammar
+import translator
+import cegis
+import feasibility
+from main import ReadBenchmark
+
+Benchmark = '''(set-logic LIA)
+(synth-fun f ((x Int)) Int
+    ((Start Int (x 0 1 (+ Start Start) (ite B Start Start)))
+     (B Bool ((<= Start Start)))))
+(declare-var x Int)
+(constraint (= (f x) (+ x 5)))
+(check-synth)
+'''
+
+
+def test_constant_leaves_with_holes(tmp_path):
+    path = tmp_path / 'f.sl'
+    path.write_text(Benchmark)
+    bmExpr, SynFunExpr = ReadBenchmark(str(path))
+    Grammar = grammar.Grammar(SynFunExpr, constants=True)
+    cegisChecker = cegis.CegisChecker(translator.ReadQuery(bmExpr))
+    cegisChecker.addPoint({'x': 0})
+    cegisChecker.addPoint({'x': 1})
+    smt = feasibility.FeasibilityChecker(Grammar, cegisChecker)
+    def completable(Program):
+        Holes, Consts = {}, {}
+        Program = smt.holes(Program, Holes, Consts)
+        return smt.checker.completable(Program, Holes, cegisChecker.points, feasibility.TIMEOUT, Consts)
+    # the hole can make up for any constant
+    assert completable(['+', '@Start', 'Start'])
+    # f must be 5 at x = 0 and 6 at x = 1, but either branch is 0 or 1
+    assert not completable(['ite', 'B', '@Start', '@Start'])
@@ -0,0 +1,23 @@
+import grammar
+import frontier
+import terms
+
+SynFunExpr = ['synth-fun', 'f', [['x', 'Int'], ['y', 'Int']], 'Int',
+              [['Start', 'Int', ['x', 'y', ['+', 'Start', 'Start'], ['ite', 'B', 'Start', 'Start']]],
+               ['B', 'Bool', [['<=', 'Start', 'Start']]]]]
+
+
+def test_derived_start_costs_what_expansion_reaches():
+    Grammar = grammar.Grammar(SynFunExpr)
+    Rules = terms.CompileRules(Grammar)
+    byId = terms.RuleIndex(Rules)
+    Weights = {'(+ Start Start)': 2.5, '(ite B Start Start)': 4, 'x': 0.5, '(<= Start Start)': 3}
+    for order in ('weighted', 'pcfg'):
+        ordering = frontier.Ordering(order, Grammar, Weights)
+        program = terms.StartPartial(Grammar)
+        cost = ordering.initial(program)
+        for p in [Grammar.ProdText.index(text) for text in ('(ite B Start Start)', '(<= Start Start)', 'x', 'y')]:
+            program = program.child(byId[p])
+            cost = ordering.child(cost, byId[p], program)
+        derived = terms.Derive(Grammar, Rules, terms.Derivation(program))
+        assert abs(ordering.initial(derived) - cost) < 1e-9
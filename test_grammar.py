@@ -0,0 +1,16 @@
+import grammar
+
+
+def test_exhausted_only_for_finite_grammars():
+    Finite = grammar.Grammar(['synth-fun', 'f', [['x', 'Int'], ['y', 'Int']], 'Int',
+                              [['Start', 'Int', ['x', 'y', ['+', 'A', 'A']]],
+                               ['A', 'Int', ['x', '1', ['-', 'B', 'B']]],
+                               ['B', 'Int', ['y', '0']]]])
+    # the largest program, (+ (- B B) (- B B)), has 7 symbols; sizes 2 and 4 have none
+    assert not Finite.exhausted(2)
+    assert not Finite.exhausted(6)
+    assert not Finite.exhausted(14)
+    assert Finite.exhausted(15) # a larger program would have at most 2 * 7 + 1 symbols
+    Infinite = grammar.Grammar(['synth-fun', 'f', [['x', 'Int']], 'Int',
+                                [['Start', 'Int', ['x', ['+', 'Start', 'Start']]]]])
+    assert not Infinite.exhausted(40)
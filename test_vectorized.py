@@ -0,0 +1,39 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+import vectorized
+from vectorized import EvaluateBatch
+
+
+def test_and_or_broadcast_mixed_shapes():
+    x = vectorized.Column([-1, 0, 2])
+    hole = numpy.array([[True, True, False], [False, True, True]]) # two terms over three inputs
+    Env = {'x': (x, None), 'B': (hole, None)}
+    val, mask = EvaluateBatch(['and', ['>=', 'x', '0'], 'B'], Env)
+    assert mask is None
+    assert val.tolist() == [[False, True, False], [False, True, True]]
+    val, mask = EvaluateBatch(['or', 'false', ['>=', 'x', '0'], 'B'], Env)
+    assert val.tolist() == [[True, True, True], [False, True, True]]
+    val, mask = EvaluateBatch(['and', 'true', ['>=', 'x', '0']], Env)
+    assert val.dtype == bool and val.tolist() == [False, True, True]
+
+
+def test_scalar_overflow_stays_an_array():
+    big = str(2**62)
+    for Expr, expected in [(['+', big, big], 2**63),
+                           (['-', ['-', big], big], -2**63),
+                           (['*', big, '4'], 2**64),
+                           (['div', ['*', big, '4'], '3'], 2**64 // 3),
+                           (['abs', ['*', big, '-4']], 2**64)]:
+        val, mask = EvaluateBatch(Expr, {})
+        assert isinstance(val, numpy.ndarray) and val.dtype == object
+        assert int(val) == expected
+    val, mask = EvaluateBatch(['ite', ['>', ['+', big, big], '0'], '1', '2'], {})
+    assert int(val) == 1
+
+
+def test_batchable():
+    assert vectorized.Batchable(['ite', ['<=', '$0', 'x'], ['+', '$1', '1'], '$0'])
+    assert vectorized.Batchable(['distinct', '$0', '$1'])
+    assert not vectorized.Batchable(['distinct', '$0', '$1', '$2'])
+    assert not vectorized.Batchable(['+', ['dbl', '$0'], '1']) # a define-fun of the spec
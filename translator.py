@@ -1,4 +1,6 @@
 from z3 import *
+import time
+import evaluator
 
 verbose=False
 
@@ -41,7 +43,111 @@ def toString(Expr,Bracket=True,ForceBracket=False):
     else:
         return "(%s)"%(' '.join(subexpr))
 
-def ReadQuery(bmExpr):
+Z3Operators={
+    '+':lambda *args: Sum(*args),
+    '-':lambda *args: -args[0] if len(args)==1 else args[0]-Sum(*args[1:]),
+    '*':lambda *args: Product(*args),
+    'div':lambda a,b: a/b, # Int / is SMT-LIB div
+    'mod':lambda a,b: a%b,
+    'abs':lambda a: If(a>=0,a,-a),
+    'ite':lambda c,a,b: If(c,a,b),
+    'and':lambda *args: And(*args),
+    'or':lambda *args: Or(*args),
+    'not':lambda a: Not(a),
+    '=>':lambda *args: Implies(args[0],args[1]) if len(args)==2 else Implies(args[0],Z3Operators['=>'](*args[1:])),
+    'xor':lambda a,b: Xor(a,b),
+    '=':lambda a,b: a==b,
+    '<':lambda a,b: a<b,
+    '<=':lambda a,b: a<=b,
+    '>':lambda a,b: a>b,
+    '>=':lambda a,b: a>=b,
+    'distinct':lambda *args: Distinct(*args),
+}
+
+def ToZ3(Expr,Env,Funcs):
+    # compile a nested-list term straight into a z3 AST
+    # Env maps names to z3 terms, Funcs maps function names to callables building z3 terms
+    if type(Expr)==tuple:
+        if Expr[0]=='Bool':
+            return BoolVal(bool(Expr[1]))
+        return IntVal(Expr[1])
+    if type(Expr)==str:
+        if Expr in Env:
+            return Env[Expr]
+        if Expr=='true':
+            return BoolVal(True)
+        if Expr=='false':
+            return BoolVal(False)
+        return IntVal(int(Expr))
+    if len(Expr)==1:
+        return ToZ3(Expr[0],Env,Funcs)
+    args=[ToZ3(e,Env,Funcs) for e in Expr[1:]]
+    if Expr[0] in Funcs:
+        return Funcs[Expr[0]](*args)
+    return Z3Operators[Expr[0]](*args)
+
+SCOPED_LIMIT=100 # incremental checks per solver before it is rebuilt
+
+def SetSeed(seed):
+    # Z3's random choices decide which model (counter-example) a check returns
+    set_param('smt.random_seed', seed)
+    set_param('sat.random_seed', seed)
+
+def PyVal(value):
+    if type(value)==bool:
+        return BoolVal(value)
+    return IntVal(value)
+
+def DefineFunString(FuncDefine,Program):
+    FuncDefineStr = toString(FuncDefine,ForceBracket = True) # use Force Bracket = True on function definition. MAGIC CODE. DO NOT MODIFY THE ARGUMENT ForceBracket = True.
+    ProgramStr = toString(Program)
+    return FuncDefineStr[:-1]+' '+ProgramStr+FuncDefineStr[-1] # insert Program just before the last bracket ')'
+
+def ConstraintBody(constraint):
+    # (constraint e) -> e; also accept the unbracketed (constraint >= a b) form some benchmarks use
+    if len(constraint)==2:
+        return constraint[1]
+    return constraint[1:]
+
+def Applications(Expr,decl,found,visited):
+    # every distinct application of decl inside a z3 term
+    if Expr.get_id() in visited:
+        return
+    visited.add(Expr.get_id())
+    if is_app(Expr):
+        if Expr.decl().eq(decl):
+            found.append(Expr)
+        for child in Expr.children():
+            Applications(child,decl,found,visited)
+
+def Mentions(Expr,names):
+    if type(Expr)==list:
+        for e in Expr:
+            if Mentions(e,names):
+                return True
+        return False
+    return type(Expr)==str and Expr in names
+
+def ExampleRow(body,synFunName,VarNames,Funcs):
+    # (= (f c1 .. cn) c) or (= c (f c1 .. cn)) with ground c's -> ((c1 .. cn), c), otherwise None
+    if type(body)!=list or len(body)!=3 or body[0]!='=' or Mentions(body,VarNames):
+        return None
+    for call,expected in ((body[1],body[2]),(body[2],body[1])):
+        if type(call)==list and len(call)>0 and call[0]==synFunName \
+                and not Mentions(call[1:],[synFunName]) and not Mentions(expected,[synFunName]):
+            try:
+                inputs=tuple(evaluator.Evaluate(e,{},Funcs) for e in call[1:])
+                return inputs,evaluator.Evaluate(expected,{},Funcs)
+            except evaluator.Undecided:
+                return None
+    return None
+
+class ExampleMismatch:
+    # counter-example found in the example table: it holds whatever the declared variables are
+    def __init__(self,row):
+        self.row=row
+
+def ReadQuery(bmExpr,incremental=False):
     SynFunExpr=[]
     VarDecMap={}
     Constraints=[]
@@ -83,6 +189,26 @@ def ReadQuery(bmExpr):
             self.targetFunction=Function('__TARGET_FUNCTION__', *(self.Sorts))
     synFunction=SynFunction(SynFunExpr)
 
+    # ground input/output examples are checked by the interpreter, only the rest goes to Z3
+    EvalFuncs={}
+    for name in FunDefMap:
+        EvalFuncs[name]=([arg[0] for arg in FunDefMap[name][2]],FunDefMap[name][4])
+    Examples=[]
+    SolverConstraints=[]
+    for constraint in Constraints:
+        row=ExampleRow(ConstraintBody(constraint),synFunction.name,VarDecMap,EvalFuncs)
+        if row is None:
+            SolverConstraints.append(constraint)
+        else:
+            Examples.append(row)
+
+    # define-fun bodies are expanded as macros
+    Z3Funcs={}
+    for name in FunDefMap:
+        def expand(*args,FunDef=FunDefMap[name]):
+            return ToZ3(FunDef[4],dict(zip([arg[0] for arg in FunDef[2]],args)),Z3Funcs)
+        Z3Funcs[name]=expand
+
     class Checker:
         def __init__(self, VarTable,  synFunction, Constraints):
 
@@ -93,34 +219,165 @@ def ReadQuery(bmExpr):
 
             self.Constraints=Constraints
 
+            self.FunDefMap=FunDefMap
+
+            self.SynFunExpr=SynFunExpr
 
 
+
+            # the spec is compiled once, with the synth-fun left as the __TARGET_FUNCTION__ UF
+            Funcs=dict(Z3Funcs)
+            Funcs[synFunction.name]=synFunction.targetFunction
+            self.Z3Funcs=Z3Funcs
+            self.Spec=And([ToZ3(ConstraintBody(constraint),self.VarTable,Funcs) for constraint in SolverConstraints])
+            self.Examples=Examples
+            self.SolverConstraints=SolverConstraints
+            self.EvalFuncs=EvalFuncs
+            self.argNames=[arg[0] for arg in synFunction.argList]
+            # candidate bodies refer to the synth-fun arguments as de Bruijn variables
+            self.ArgEnv={}
+            for i in range(len(synFunction.argList)):
+                self.ArgEnv[synFunction.argList[i][0]]=Var(i,synFunction.Sorts[i])
+
             self.solver=Solver()
+            self.checkCount=0
+            self.solverTime=0.0
 
-        def check(self,funcDefStr):
-            self.solver.push()
-            
-            
-            spec_smt2=[funcDefStr]
-            for constraint in Constraints:
-                spec_smt2.append('(assert %s)'%(toString(constraint[1:])))
-            spec_smt2='\n'.join(spec_smt2)
-            #print spec_smt2
-            spec = parse_smt2_string(spec_smt2,decls=dict(self.VarTable))
-            spec = And(spec)
-            self.solver.add(Not(spec))
-            if verbose:
-                print("spec:",spec)
+            # incremental mode: Not(spec) is asserted once over the UF, and each candidate is
+            # bound to it by f(a) == body(a) for every application f(a) in the spec, in its own scope
+            self.incremental=incremental
+            if incremental:
+                self.Calls=[]
+                Applications(self.Spec,synFunction.targetFunction,self.Calls,set())
+                self.solver.add(Not(self.Spec))
+                self.scopedCount=0
 
-            res=self.solver.check()
-            if res==unsat:
-                self.solver.pop()
+        def instantiate(self,Program):
+            # the spec with the candidate body substituted for the synth-fun
+            body=ToZ3(Program,self.ArgEnv,self.Z3Funcs)
+            return substitute_funs(self.Spec,(self.synFunction.targetFunction,body))
+
+        def failingExample(self,Program):
+            # index of the first example row the program gets wrong, or None
+            for i in range(len(self.Examples)):
+                inputs,expected=self.Examples[i]
+                try:
+                    if evaluator.Evaluate(Program,dict(zip(self.argNames,inputs)),self.EvalFuncs)!=expected:
+                        return i
+                except evaluator.Undecided: # the solver could pick any value here, so the example can fail
+                    return i
+            return None
+
+        def checkProgram(self,Program):
+            # same as check, but takes the candidate as a nested list and never goes through SMT-LIB text
+            i=self.failingExample(Program)
+            if i is not None:
+                if i>0: # move-to-front, the same row tends to reject the next candidates too
+                    self.Examples.insert(0,self.Examples.pop(i))
+                return ExampleMismatch(self.Examples[0])
+            if len(self.SolverConstraints)==0:
                 return None
+            self.checkCount+=1
+            timeStart=time.time()
+            if self.incremental:
+                model=self.checkScoped(Program)
             else:
-                model=self.solver.model()
+                self.solver.push()
+                self.solver.add(Not(self.instantiate(Program)))
+                res=self.solver.check()
+                model=None if res==unsat else self.solver.model()
                 self.solver.pop()
-                
-                return model
-    
+            self.solverTime+=time.time()-timeStart
+            return model
+
+        def checkScoped(self,Program):
+            # only the candidate's definition is scoped, Not(spec) stays asserted in the base level;
+            # Z3 still slows down over many scopes, so the solver is rebuilt every SCOPED_LIMIT checks
+            if self.scopedCount==SCOPED_LIMIT:
+                self.solver=Solver()
+                self.solver.add(Not(self.Spec))
+                self.scopedCount=0
+            self.scopedCount+=1
+            body=ToZ3(Program,self.ArgEnv,self.Z3Funcs)
+            self.solver.push()
+            self.solver.add([call==substitute_vars(body,*call.children()) for call in self.Calls])
+            res=self.solver.check()
+            model=None if res==unsat else self.solver.model()
+            self.solver.pop()
+            return model
+
+        def solveConstants(self,Program,Consts,points):
+            # values for the constant leaves of Program (Consts maps each name to its allowed values,
+            # or None for any integer) under which the examples and the spec hold at every stored point
+            Env=dict(self.ArgEnv)
+            for name in Consts:
+                Env[name]=Int(name)
+            body=ToZ3(Program,Env,self.Z3Funcs)
+            solver=Solver()
+            for name in Consts:
+                if Consts[name] is not None:
+                    solver.add(Or([Env[name]==v for v in Consts[name]]))
+            for inputs,expected in self.Examples:
+                solver.add(substitute_vars(body,*[PyVal(v) for v in inputs])==PyVal(expected))
+            if len(self.SolverConstraints)>0:
+                spec=substitute_funs(self.Spec,(self.synFunction.targetFunction,body))
+                for point in points:
+                    solver.add(substitute(spec,*[(self.VarTable[var],PyVal(point[var])) for var in point]))
+            self.checkCount+=1
+            timeStart=time.time()
+            res=solver.check()
+            self.solverTime+=time.time()-timeStart
+            if res!=sat:
+                return None
+            model=solver.model()
+            return {name:model.eval(Env[name],model_completion=True).as_long() for name in Consts}
+
+        def completable(self,Program,Holes,points,timeout,Consts=None):
+            # whether some functions of the synth-fun arguments, put in place of the holes of Program
+            # (Holes maps each hole leaf to its sort), and values of its constant leaves (Consts as in
+            # solveConstants) make the examples and the spec hold at every stored point:
+            # True, False, or None when Z3 gives up within timeout milliseconds
+            Env=dict(self.ArgEnv)
+            Vars=[self.ArgEnv[name] for name in self.argNames]
+            for name in Holes:
+                Env[name]=Function(name,*(self.synFunction.Sorts[:-1]+[getSort(Holes[name])]))(*Vars)
+            Consts=Consts or {}
+            for name in Consts:
+                Env[name]=Int(name)
+            body=ToZ3(Program,Env,self.Z3Funcs)
+            solver=Solver()
+            solver.set('timeout',timeout)
+            for name in Consts:
+                if Consts[name] is not None:
+                    solver.add(Or([Env[name]==v for v in Consts[name]]))
+            for inputs,expected in self.Examples:
+                solver.add(substitute_vars(body,*[PyVal(v) for v in inputs])==PyVal(expected))
+            if len(self.SolverConstraints)>0:
+                spec=substitute_funs(self.Spec,(self.synFunction.targetFunction,body))
+                for point in points:
+                    solver.add(substitute(spec,*[(self.VarTable[var],PyVal(point[var])) for var in point]))
+            self.checkCount+=1
+            timeStart=time.time()
+            res=solver.check()
+            self.solverTime+=time.time()-timeStart
+            if res==unknown:
+                return None
+            return res==sat
+
+        def getPoint(self,model):
+            # turn a counter-example model into {var name: python value}
+            point={}
+            if isinstance(model,ExampleMismatch):
+                for var in self.VarTable:
+                    point[var]=False if is_bool(self.VarTable[var]) else 0
+                return point
+            for var in self.VarTable:
+                value=model.eval(self.VarTable[var],model_completion=True)
+                if is_bool(value):
+                    point[var]=is_true(value)
+                else:
+                    point[var]=value.as_long()
+            return point
+
     checker=Checker(VarTable, synFunction, Constraints)
     return checker
@@ -0,0 +1,121 @@
+# Divide-and-conquer synthesis for specs whose answer is a case split (max-N,
+# array_search-N): enumerate small terms until every counter-example is
+# satisfied by some term, enumerate predicates from the condition nonterminal
+# of the grammar's ite production, and learn a decision tree over the points
+# whose leaves are terms and whose splits are predicates. The tree becomes a
+# nested ite and goes to Z3; a counter-example starts the next round.
+# Terms and predicates come from the bottom-up enumerator, so they are
+# deduplicated by observational equivalence on the stored inputs; the
+# decisiontree.Learner keeps their bitsets over the points across rounds and
+# only evaluates them on each new counter-example.
+import translator
+import decisiontree
+from bottomup import BottomUp
+from cegis import Undef
+from evaluator import Evaluate, Undecided
+from grammar import Fill
+
+
+def IteProduction(grammar):
+    # the production (ite Cond Start Start) of the start symbol, or None
+    for p in grammar.productions(grammar.Start):
+        children = list(grammar.children(p))
+        if type(grammar.Templates[p]) == list and grammar.Templates[p][0] == 'ite' and len(children) == 3 and \
+           children[1] == children[2] == grammar.Start:
+            return p
+    return None
+
+
+class Unify:
+    def __init__(self, grammar, FuncDefine, cegisChecker):
+        self.grammar = grammar
+        self.FuncDefine = FuncDefine
+        self.cegisChecker = cegisChecker
+        self.bottomUp = BottomUp(grammar, FuncDefine, cegisChecker)
+        self.Start = grammar.Start
+        self.Ite = IteProduction(grammar) # (ite Cond Start Start)
+        if self.Ite is None:
+            raise ValueError('the grammar of %s has no ite production' % grammar.FunName)
+        self.And = None # production (and Cond Cond), used to join features
+        self.Cond = grammar.children(self.Ite)[0]
+        for p in grammar.productions(self.Cond):
+            if grammar.Templates[p] == ['and', '$0', '$1'] and list(grammar.children(p)) == [self.Cond, self.Cond]:
+                self.And = p
+        self.learner = decisiontree.Learner(conjunctions=self.And is not None)
+        self.known = set() # text of every term and predicate the learner has
+        self.Rounds = 0
+        self.Stopped = None # why the search left unification, if it did
+
+    @property
+    def Count(self):
+        return self.bottomUp.Count
+
+    def program(self, tree):
+        if tree[0] == 'leaf':
+            return tree[1]
+        cond = tree[1][-1]
+        for p in reversed(tree[1][:-1]):
+            cond = Fill(self.grammar.Templates[self.And], [p, cond])
+        return Fill(self.grammar.Templates[self.Ite], [cond, self.program(tree[2]), self.program(tree[3])])
+
+    def round(self):
+        # enumerate until the stored points can be split into cases; returns the program to verify
+        Inputs = self.cegisChecker.Inputs()
+        PointInputs = self.cegisChecker.pointInputs()
+        learner = self.learner
+        All = learner.all()
+        Covers = [bits for term, bits in learner.Labels]
+        Splits = set(bits for pred, bits in learner.Features)
+        lastSize = 1
+        for NT, size, Program, Sig in self.bottomUp.generate(Inputs):
+            if size > lastSize and learner.covered():
+                tree = learner.learn()
+                if tree is not None:
+                    return self.program(tree)
+            lastSize = size
+            if str(Program) in self.known:
+                continue
+            if NT == self.Start and (len(Covers) == 0 or not learner.covered()) and not (type(Program) == list and Program[0] == 'ite'):
+                # terms are collected until they cover every point; the cases are the predicates' job
+                cover = self.cegisChecker.passingPoints(dict(zip(Inputs, Sig)))
+                if all(cover & ~old for old in Covers):
+                    Covers.append(cover)
+                    learner.addLabel(Program, cover)
+                    self.known.add(str(Program))
+                    if cover == All:
+                        return Program # one term is enough; also how the first round gets its counter-example
+            if NT == self.Cond:
+                Values = dict(zip(Inputs, Sig))
+                if any(inp is None or Values.get(inp, Undef) is Undef for inp in PointInputs):
+                    continue
+                bits = 0
+                for i in range(len(PointInputs)):
+                    if Values[PointInputs[i]]:
+                        bits |= 1 << i
+                if bits not in Splits and bits != 0 and bits != All:
+                    Splits.add(bits)
+                    learner.addFeature(Program, bits)
+                    self.known.add(str(Program))
+
+    def holds(self, pred, Inputs):
+        if Inputs is None:
+            return False
+        try:
+            return bool(Evaluate(pred, dict(zip(self.bottomUp.argNames, Inputs)), self.cegisChecker.Funcs))
+        except Undecided:
+            return False
+
+    def search(self):
+        while True:
+            self.Rounds += 1
+            Program = self.round()
+            points = len(self.cegisChecker.points)
+            if self.cegisChecker.verify(Program) is None:
+                return translator.DefineFunString(self.FuncDefine, Program)
+            if len(self.cegisChecker.points) == points:
+                # the counter-example was already stored, the next round would learn the same tree
+                self.Stopped = 'counter-example already stored, enumerating bottom-up'
+                return self.bottomUp.search()
+            PointInputs = self.cegisChecker.pointInputs()
+            for i in range(points, len(self.cegisChecker.points)):
+                self.learner.addPoint(lambda term: self.cegisChecker.holdsAt(term, i), lambda pred: self.holds(pred, PointInputs[i]))
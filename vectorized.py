@@ -0,0 +1,188 @@
+# Batch evaluation with NumPy: a term (or a batch of terms sharing one template)
+# is evaluated on every stored input at once, one array operation per AST node.
+# Values are int64 or bool arrays; when an operation could overflow int64 the
+# operands are switched to object arrays of python ints. Every value carries a
+# "defined" mask (None when defined everywhere) for SMT-LIB div/mod by zero.
+try:
+    import numpy
+except ImportError: # the engines fall back to evaluator.Evaluate
+    numpy = None
+
+INT64_LIMIT = 2**62 # keep a bit of headroom so the checks below stay in int64
+
+
+def Bound(a):
+    # largest absolute value in a
+    if a.dtype == bool or a.size == 0:
+        return 1
+    return max(abs(int(a.max())), abs(int(a.min())))
+
+def Wide(*args):
+    return [a.astype(object) for a in args]
+
+def Array(result):
+    # object operations on 0-d operands give back python ints; keep every value an array
+    if isinstance(result, numpy.ndarray) and result.dtype != object:
+        return result
+    return numpy.asarray(result, dtype=object)
+
+def Column(values):
+    # python values -> array
+    if len(values) > 0 and type(values[0]) == bool:
+        return numpy.array(values, dtype=bool)
+    try:
+        ret = numpy.array(values, dtype=numpy.int64)
+        if Bound(ret) < INT64_LIMIT:
+            return ret
+    except OverflowError:
+        pass
+    return numpy.array(values, dtype=object)
+
+def Scalar(value):
+    if type(value) == bool:
+        return numpy.array(value)
+    return Column([value]).reshape(())
+
+def Both(m1, m2):
+    if m1 is None:
+        return m2
+    if m2 is None:
+        return m1
+    return m1 & m2
+
+
+def Add(a, b):
+    if a.dtype != object and b.dtype != object:
+        if Bound(a) + Bound(b) < INT64_LIMIT:
+            return a + b
+        a, b = Wide(a, b)
+    return Array(a + b)
+
+def Sub(a, b):
+    if a.dtype != object and b.dtype != object:
+        if Bound(a) + Bound(b) < INT64_LIMIT:
+            return a - b
+        a, b = Wide(a, b)
+    return Array(a - b)
+
+def Mul(a, b):
+    if a.dtype != object and b.dtype != object:
+        if Bound(a) * Bound(b) < INT64_LIMIT:
+            return a * b
+        a, b = Wide(a, b)
+    return Array(a * b)
+
+def DivMod(a, b):
+    # SMT-LIB: a = b*q + r with 0 <= r < |b|; division by zero is left undefined
+    wide = a.dtype == object or b.dtype == object
+    if wide:
+        a, b = Wide(a, b)
+    zero = b == 0
+    if zero.any():
+        b = numpy.where(zero, 1, b)
+        mask = ~zero
+    else:
+        mask = None
+    r = numpy.mod(a, numpy.abs(b))
+    q = (a - r) // b
+    if wide:
+        q, r = Array(q), Array(r)
+    return q, r, mask
+
+
+def Batchable(Expr):
+    # whether EvaluateBatch has every operator of Expr (not, e.g., calls to a define-fun of the spec)
+    if type(Expr) != list:
+        return True
+    if len(Expr) == 1:
+        return Batchable(Expr[0])
+    op = Expr[0]
+    if op not in BatchOps and op not in Comparisons and not (op == 'distinct' and len(Expr) == 3):
+        return False
+    return all(Batchable(e) for e in Expr[1:])
+
+BatchOps = set(['ite', '+', '-', '*', 'div', 'mod', 'abs', 'and', 'or', 'not', '=>', 'xor'])
+
+
+def EvaluateBatch(Expr, Env):
+    # -> (values, defined mask); Env maps names to arrays that broadcast against each other
+    if type(Expr) == tuple:
+        return Scalar(bool(Expr[1]) if Expr[0] == 'Bool' else Expr[1]), None
+    if type(Expr) == str:
+        if Expr in Env:
+            return Env[Expr]
+        if Expr == 'true':
+            return Scalar(True), None
+        if Expr == 'false':
+            return Scalar(False), None
+        return Scalar(int(Expr)), None
+    if len(Expr) == 1:
+        return EvaluateBatch(Expr[0], Env)
+    op = Expr[0]
+    args = [EvaluateBatch(e, Env) for e in Expr[1:]]
+    vals = [a[0] for a in args]
+    mask = None
+    for a in args:
+        mask = Both(mask, a[1])
+    if op == 'ite':
+        c, a, b = args
+        mask = c[1]
+        if a[1] is not None or b[1] is not None:
+            am = a[1] if a[1] is not None else True
+            bm = b[1] if b[1] is not None else True
+            mask = Both(mask, numpy.where(c[0], am, bm))
+        return numpy.where(c[0], a[0], b[0]), mask
+    if op == '+':
+        ret = vals[0]
+        for v in vals[1:]:
+            ret = Add(ret, v)
+        return ret, mask
+    if op == '-':
+        if len(vals) == 1:
+            return Sub(Scalar(0), vals[0]), mask
+        ret = vals[0]
+        for v in vals[1:]:
+            ret = Sub(ret, v)
+        return ret, mask
+    if op == '*':
+        ret = vals[0]
+        for v in vals[1:]:
+            ret = Mul(ret, v)
+        return ret, mask
+    if op == 'div' or op == 'mod':
+        q, r, m = DivMod(vals[0], vals[1])
+        return (q if op == 'div' else r), Both(mask, m)
+    if op == 'abs':
+        ret = numpy.abs(vals[0])
+        return (Array(ret) if vals[0].dtype == object else ret), mask
+    if op == 'and' or op == 'or':
+        # pairwise, so a literal or an input column broadcasts against a batch of holes
+        combine = numpy.logical_and if op == 'and' else numpy.logical_or
+        ret = vals[0]
+        for v in vals[1:]:
+            ret = combine(ret, v)
+        return numpy.asarray(ret, dtype=bool), mask
+    if op == 'not':
+        return numpy.logical_not(vals[0]), mask
+    if op == '=>':
+        return numpy.logical_or(numpy.logical_not(vals[0]), vals[1]), mask
+    if op == 'xor':
+        return numpy.logical_xor(vals[0], vals[1]), mask
+    if op in Comparisons:
+        ret = Comparisons[op](vals[0], vals[1])
+        for i in range(1, len(vals) - 1):
+            ret = ret & Comparisons[op](vals[i], vals[i+1])
+        return numpy.asarray(ret, dtype=bool), mask
+    if op == 'distinct' and len(vals) == 2:
+        return numpy.asarray(numpy.not_equal(vals[0], vals[1]), dtype=bool), mask
+    raise ValueError('no batch version of %s' % op)
+
+Comparisons = {}
+if numpy is not None:
+    Comparisons = {
+        '=': numpy.equal,
+        '<': numpy.less,
+        '<=': numpy.less_equal,
+        '>': numpy.greater,
+        '>=': numpy.greater_equal,
+    }